@@ -0,0 +1,62 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from ecg_files import EXAMPLE_RECORDING_FILE, load_text_recording
+
+
+# the loader EcgWindow.load_file used before load_text_recording, kept here as the baseline
+def load_text_recording_with_readlines(filename_with_path):
+    with open(filename_with_path, 'r') as file:
+        file_content = file.readlines()
+        return [int(line.strip()) for line in file_content]
+
+
+def write_scaled_example(filename_with_path, line_count):
+    example = np.loadtxt(EXAMPLE_RECORDING_FILE, dtype=np.uint16)
+    samples = np.resize(example, line_count)
+    np.savetxt(filename_with_path, samples, fmt='%d')
+
+
+def measure(loader, filename_with_path):
+    start_time = time.perf_counter()
+    result = loader(filename_with_path)
+    elapsed_time = time.perf_counter() - start_time
+
+    # tracing every allocation slows the loaders down, so the memory is measured in a second run
+    tracemalloc.start()
+    loader(filename_with_path)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed_time, peak_memory, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the readlines based and the bulk text recording loader.")
+    parser.add_argument("--lines", type=int, nargs="+", default=[1000000, 5000000])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for line_count in args.lines:
+            filename_with_path = os.path.join(directory, "recording.txt")
+            write_scaled_example(filename_with_path, line_count)
+
+            readlines_time, readlines_memory, readlines_result = measure(load_text_recording_with_readlines,
+                                                                         filename_with_path)
+            bulk_time, bulk_memory, bulk_result = measure(load_text_recording, filename_with_path)
+            if not np.array_equal(readlines_result, bulk_result):
+                sys.exit("The bulk loader differs from the readlines loader at " + str(line_count) + " lines")
+            print(f"{line_count} lines: readlines {readlines_time:.3f} s / {readlines_memory / 2 ** 20:.0f} MiB peak, "
+                  f"bulk {bulk_time:.3f} s / {bulk_memory / 2 ** 20:.0f} MiB peak, "
+                  f"speedup {readlines_time / bulk_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
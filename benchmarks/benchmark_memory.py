@@ -0,0 +1,63 @@
+import argparse
+import os
+import sys
+import tempfile
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from ecg_analysis import EcgProcessor
+from ecg_buffers import SampleStore
+from ecg_decimation import MinMaxPyramid
+from ecg_files import EXAMPLE_RECORDING_FILE, EXAMPLE_RECORDING_SAMPLE_RATE, RecordingWriter
+
+SAMPLING_RATE = EXAMPLE_RECORDING_SAMPLE_RATE  # hertz
+CHUNK_DURATION = 1  # seconds of samples per processing step
+
+
+def measure_memory_per_hour(hours=1):
+    # the memory a live measurement holds after the given time: the sample store, the processor's R peak intervals and
+    # the min/max pyramid, fed a second of samples at a time like the processing worker does. Returns bytes per hour.
+    example = np.loadtxt(EXAMPLE_RECORDING_FILE, dtype=np.uint16)
+    chunk_sample_count = CHUNK_DURATION * SAMPLING_RATE
+    chunk_count = int(hours * 3600 / CHUNK_DURATION)
+
+    tracemalloc.start()
+    ecg_data = SampleStore()
+    processor = EcgProcessor(ecg_data, 1000 / SAMPLING_RATE, min_max_pyramid=MinMaxPyramid())
+    for i in range(chunk_count):
+        offset = (i * chunk_sample_count) % (len(example) - chunk_sample_count)
+        ecg_data.extend(example[offset:offset + chunk_sample_count])
+        processor.process()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return memory / hours
+
+
+def measure_recording_size_per_hour(hours=0.1):
+    # the size of a binary recording, written through the RecordingWriter like during a live measurement
+    samples = np.resize(np.loadtxt(EXAMPLE_RECORDING_FILE, dtype=np.uint16), int(hours * 3600 * SAMPLING_RATE))
+    with tempfile.TemporaryDirectory() as directory:
+        filename_with_path = os.path.join(directory, "recording.ecgb")
+        recording_writer = RecordingWriter(filename_with_path, SAMPLING_RATE)
+        recording_writer.start()
+        for offset in range(0, len(samples), SAMPLING_RATE):
+            recording_writer.write(samples[offset:offset + SAMPLING_RATE])
+        recording_writer.stop()
+        return os.path.getsize(filename_with_path) / hours
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the memory and the disk space an hour of measurement takes.")
+    parser.add_argument("--hours", type=float, default=1)
+    args = parser.parse_args()
+
+    print(f"memory: {measure_memory_per_hour(args.hours) / 2 ** 20:.2f} MiB per hour, "
+          f"binary recording: {measure_recording_size_per_hour() / 2 ** 20:.2f} MiB per hour "
+          f"(the samples alone are {SAMPLING_RATE * 3600 * 2 / 2 ** 20:.2f} MiB)")
+
+
+if __name__ == '__main__':
+    main()
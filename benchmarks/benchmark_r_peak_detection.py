@@ -0,0 +1,46 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from ecg_analysis import R_PEAK_LOWER_THRESHOLD, R_PEAK_UPPER_THRESHOLD, detect_r_peaks_loop, \
+    detect_r_peaks_vectorized
+from ecg_files import EXAMPLE_RECORDING_FILE, EXAMPLE_RECORDING_SAMPLE_RATE
+
+SAMPLING_RATE = EXAMPLE_RECORDING_SAMPLE_RATE  # hertz
+
+
+def load_scaled_example(hours):
+    example = np.loadtxt(EXAMPLE_RECORDING_FILE, dtype=np.uint16)
+    repeat_count = max(1, int(np.ceil(hours * 3600 * SAMPLING_RATE / len(example))))
+    return np.tile(example, repeat_count)
+
+
+def measure(detector, ecg_data):
+    start_time = time.perf_counter()
+    result = detector(ecg_data, R_PEAK_UPPER_THRESHOLD, R_PEAK_LOWER_THRESHOLD)
+    return time.perf_counter() - start_time, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the loop and the vectorized R peak detector.")
+    parser.add_argument("--hours", type=float, nargs="+", default=[0.25, 1, 4])
+    args = parser.parse_args()
+
+    for hours in args.hours:
+        ecg_data = load_scaled_example(hours)
+        loop_time, loop_result = measure(detect_r_peaks_loop, ecg_data)
+        vectorized_time, vectorized_result = measure(detect_r_peaks_vectorized, ecg_data)
+        if loop_result != vectorized_result:
+            sys.exit("The vectorized detector differs from the loop at " + str(hours) + " hours of data")
+        print(f"{hours:g} h ({len(ecg_data)} samples, {len(loop_result[0])} R peaks): "
+              f"loop {loop_time:.3f} s, vectorized {vectorized_time:.3f} s, "
+              f"speedup {loop_time / vectorized_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
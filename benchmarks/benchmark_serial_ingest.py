@@ -0,0 +1,102 @@
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from ecg_buffers import SpscRingBuffer
+from ecg_serial import AsciiLineDecoder, BinaryFrameDecoder, SerialProtocol, SerialReader
+from ecg_simulator import VirtualMeasurementUnit, create_synthetic_beat, encode_ascii, encode_binary
+
+PROTOCOLS = {'ascii': SerialProtocol.ASCII, 'binary': SerialProtocol.BINARY}
+
+
+def measure_decoding(protocol_name, sample_count=1000000, chunk_size=4096):
+    # the decoder alone, fed in chunks of the size a bulk read typically returns at high rates
+    samples = np.resize(create_synthetic_beat(500), sample_count)
+    match PROTOCOLS[protocol_name]:
+        case SerialProtocol.BINARY:
+            data = encode_binary(samples, np.arange(sample_count) % 65536)
+            decoder = BinaryFrameDecoder()
+        case _:
+            data = encode_ascii(samples)
+            decoder = AsciiLineDecoder()
+
+    start_time = time.perf_counter()
+    decoded_count = 0
+    for offset in range(0, len(data), chunk_size):
+        decoded_count += len(decoder.decode(data[offset:offset + chunk_size]))
+    elapsed_time = time.perf_counter() - start_time
+    if decoded_count != sample_count:
+        sys.exit("The " + protocol_name + " decoder returned " + str(decoded_count) + " of " + str(sample_count)
+                 + " samples")
+    return sample_count / elapsed_time
+
+
+def run_virtual_unit(connection, sample_rate, serial_protocol):
+    # the unit runs in its own process, so it does not compete with the reader for the GIL
+    unit = VirtualMeasurementUnit(create_synthetic_beat(sample_rate), sample_rate, serial_protocol)
+    connection.send(unit.start())
+    connection.recv()
+    unit.stop()
+    connection.send(unit.sent_sample_count)
+
+
+def measure_ingest(protocol_name, sample_rate, duration=3):
+    # SerialReader against the virtual measurement unit, returns the rate of the samples that arrived in the queue, the
+    # fraction of the sent samples that did not and the share of a CPU core this process spent on them
+    serial_protocol = PROTOCOLS[protocol_name]
+    connection, child_connection = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=run_virtual_unit, args=(child_connection, sample_rate, serial_protocol),
+                                      daemon=True)
+    process.start()
+    port_name = connection.recv()
+
+    sample_queue = SpscRingBuffer(2 ** 20)
+    serial_reader = SerialReader(sample_queue, [serial_protocol])
+    serial_reader.start()
+    serial_reader.open_port(port_name, 115200)
+    serial_reader.start_measurement()
+    serial_reader.write(b'1')
+
+    start_time = time.perf_counter()
+    start_cpu_time = time.process_time()
+    received_count = 0
+    while time.perf_counter() - start_time < duration:
+        time.sleep(0.01)
+        received_count += len(sample_queue.drain())
+    serial_reader.write(b'2')
+    time.sleep(0.2)
+    received_count += len(sample_queue.drain())
+    cpu_load = (time.process_time() - start_cpu_time) / (time.perf_counter() - start_time)
+
+    serial_reader.stop()
+    connection.send('stop')
+    sent_count = connection.recv()
+    process.join()
+    lost_fraction = (sent_count - received_count) / sent_count if sent_count else 0
+    return received_count / duration, lost_fraction, cpu_load
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the serial decoders and the SerialReader against the "
+                                                 "virtual measurement unit.")
+    parser.add_argument("--protocols", nargs="+", choices=list(PROTOCOLS), default=list(PROTOCOLS))
+    parser.add_argument("--sample-rates", type=float, nargs="+", default=[500, 10000, 50000])
+    parser.add_argument("--duration", type=float, default=3, help="seconds of streaming per sample rate")
+    args = parser.parse_args()
+
+    for protocol_name in args.protocols:
+        print(f"{protocol_name} decoding: {measure_decoding(protocol_name) / 1e6:.2f} M samples/s")
+        for sample_rate in args.sample_rates:
+            received_rate, lost_fraction, cpu_load = measure_ingest(protocol_name, sample_rate, args.duration)
+            print(f"{protocol_name} at {sample_rate:g} Hz: {received_rate:.0f} samples/s received, "
+                  f"{lost_fraction:.2%} lost, {cpu_load:.1%} of a CPU core")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+# no window is ever shown, so the benchmark also runs without a display
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtWidgets import QApplication
+
+from ecg_buffers import SampleStore, SpscRingBuffer
+from ecg_files import EXAMPLE_RECORDING_FILE
+from ecg_plotting import PlotBackendCode
+from ecg_serial import SerialProtocol, SerialReader
+from ecg_ui import EcgWindow
+
+PLOT_BACKENDS = {'matplotlib': PlotBackendCode.MATPLOTLIB, 'painter': PlotBackendCode.PAINTER}
+
+
+def measure_ticks(plot_backend_name, fps=30, tick_count=300, width=1600, height=900):
+    # A live measurement at the window's sample rate without the timers and the worker thread: every tick queues the
+    # samples of one frame, runs the processing worker's step and then the window's tick including the repaint. Returns
+    # the processing and the tick times in seconds.
+    application = QApplication.instance() or QApplication(sys.argv)
+    sample_queue = SpscRingBuffer()
+    ecg_data = SampleStore()
+    window = EcgWindow(["COM3"], [115200], SerialReader(sample_queue, [SerialProtocol.ASCII]), ecg_data,
+                       sample_queue, [False], [PLOT_BACKENDS[plot_backend_name]], [fps], [False], [False])
+    window.measurement_duration = 24 * 3600
+    window.resize(width, height)
+    window.switch_stack(1)
+    application.processEvents()
+
+    window.reset_measurement_data_and_graph_ui()
+    window.is_measurement_in_progress[0] = True
+    samples = np.resize(np.loadtxt(EXAMPLE_RECORDING_FILE, dtype=np.uint16), int(tick_count * window.sampling_rate / fps) + 1)
+    frame_sample_count = len(samples) // tick_count
+
+    processing_times = []
+    tick_times = []
+    for i in range(tick_count):
+        sample_queue.push(samples[i * frame_sample_count:(i + 1) * frame_sample_count])
+        start_time = time.perf_counter()
+        window.processing_result_action(window.processing_worker.process())
+        processing_times.append(time.perf_counter() - start_time)
+
+        start_time = time.perf_counter()
+        window.tick_method()
+        window.timer.stop()
+        application.processEvents()
+        tick_times.append(time.perf_counter() - start_time)
+
+    window.is_measurement_in_progress[0] = False
+    window.close()
+    # the first ticks build the caches of the canvas
+    return np.array(processing_times[10:]), np.array(tick_times[10:])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the cost of the live processing step and of a live tick "
+                                                 "(update of the plot data, the labels and the repaint).")
+    parser.add_argument("--backends", nargs="+", choices=list(PLOT_BACKENDS), default=list(PLOT_BACKENDS))
+    parser.add_argument("--fps", type=int, nargs="+", default=[30, 60])
+    parser.add_argument("--ticks", type=int, default=300)
+    args = parser.parse_args()
+
+    for plot_backend_name in args.backends:
+        for fps in args.fps:
+            processing_times, tick_times = measure_ticks(plot_backend_name, fps, args.ticks)
+            print(f"{plot_backend_name} at {fps} FPS: processing median "
+                  f"{np.median(processing_times) * 1000:.2f} ms, tick median {np.median(tick_times) * 1000:.2f} ms, "
+                  f"p95 {np.percentile(tick_times, 95) * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from benchmark_load_file import measure as measure_loading, write_scaled_example
+from benchmark_memory import measure_memory_per_hour, measure_recording_size_per_hour
+from benchmark_r_peak_detection import load_scaled_example
+from ecg_analysis import R_PEAK_LOWER_THRESHOLD, R_PEAK_UPPER_THRESHOLD, detect_r_peaks
+from ecg_files import load_binary_recording, load_text_recording, write_binary_recording
+
+BENCHMARKS = ['load_file', 'r_peak_detection', 'serial_ingest', 'tick', 'memory']
+REPOSITORY_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+TIMING_UNITS = ('s', 'samples/s')
+REFERENCE_RESULT_NAME = 'reference.time'
+# the R peak detection of fewer samples takes a millisecond or less, that is dominated by the timer and the scheduler
+GATED_MIN_R_PEAK_DETECTION_LENGTH = 1000000
+
+
+# Runs the whole pipeline's benchmarks with sizes small enough for every commit and writes one JSON document:
+#   {"environment": {...}, "results": [{"name": ..., "value": ..., "unit": ..., "better": "lower" or "higher",
+#                                       "gated": true or false}, ...]}
+# Given a result file of an earlier version, it also reports every gated result that got worse by more than its
+# tolerance and exits with status 1, so a regression fails a CI job:
+#   - sizes in bytes by more than --tolerance relative to the baseline
+#   - fractions (the lost samples) by more than --fraction-tolerance absolute, they are usually exactly 0
+#   - timings by more than --timing-tolerance relative, after both runs are scaled by a fixed reference workload that
+#     is timed around the benchmarks, so a machine that is slower or busier as a whole does not count
+# The results that vary by far more than that between runs of the same code (sub-millisecond timings, the CPU load and
+# the received rate of the live streaming, the tick's tail latency) are reported but not gated.
+class BenchmarkResults:
+
+    def __init__(self):
+        self.results = []
+
+    def add(self, name, value, unit, better='lower', gated=True):
+        self.results.append({'name': name, 'value': float(value), 'unit': unit, 'better': better, 'gated': gated})
+        print(f"{name}: {value:.6g} {unit}" + ("" if gated else " (not gated)"), file=sys.stderr)
+
+
+def get_environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPOSITORY_DIRECTORY, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit, 'timestamp': time.time(), 'python': platform.python_version(),
+            'numpy': np.__version__, 'platform': platform.platform(), 'processor': platform.processor(),
+            'cpu_count': os.cpu_count()}
+
+
+def get_median_time(function, *args, min_repeat_count=5, min_duration=0.2):
+    # the median of at least min_repeat_count runs, repeated until they took min_duration in total. Unlike the best run
+    # it does not reward a single lucky run, so it moves less between runs of the same code.
+    times = []
+    start_time = time.perf_counter()
+    while len(times) < min_repeat_count or time.perf_counter() - start_time < min_duration:
+        run_start_time = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - run_start_time)
+    return float(np.median(times))
+
+
+def run_reference_workload():
+    # a fixed mix of numpy and interpreter work, like the benchmarks themselves
+    values = np.arange(1000000, dtype=np.int32)[::-1] % 4096
+    np.sort(values)
+    sum(range(300000))
+
+
+def run_load_file_benchmarks(results, line_count=1000000):
+    with tempfile.TemporaryDirectory() as directory:
+        text_filename_with_path = os.path.join(directory, "recording.txt")
+        write_scaled_example(text_filename_with_path, line_count)
+        _, peak_memory, samples = measure_loading(load_text_recording, text_filename_with_path)
+        elapsed_time = get_median_time(load_text_recording, text_filename_with_path, min_duration=1)
+        results.add('load_file.text.time', elapsed_time, 's')
+        results.add('load_file.text.peak_memory', peak_memory, 'B')
+
+        binary_filename_with_path = os.path.join(directory, "recording.ecgb")
+        write_binary_recording(binary_filename_with_path, samples, 500, 0)
+        _, peak_memory, _ = measure_loading(load_binary_recording, binary_filename_with_path)
+        elapsed_time = get_median_time(load_binary_recording, binary_filename_with_path)
+        # only maps the file, which takes microseconds
+        results.add('load_file.binary.time', elapsed_time, 's', gated=False)
+        results.add('load_file.binary.peak_memory', peak_memory, 'B')
+
+
+def run_r_peak_detection_benchmarks(results, lengths=(100, 1000, 10000, 100000, 1000000, 10000000)):
+    ecg_data = load_scaled_example(max(lengths) / 500 / 3600)
+    for length in lengths:
+        # the short lengths are the live chunks, they take microseconds and are only reported
+        median_time = get_median_time(detect_r_peaks, ecg_data[:length], R_PEAK_UPPER_THRESHOLD,
+                                      R_PEAK_LOWER_THRESHOLD)
+        results.add('r_peak_detection.' + str(length) + '_samples.throughput', length / median_time, 'samples/s',
+                    'higher', gated=length >= GATED_MIN_R_PEAK_DETECTION_LENGTH)
+
+
+def run_serial_ingest_benchmarks(results, sample_rates=(500, 50000), duration=2):
+    # imported here, the virtual measurement unit needs a pseudo terminal, which not every platform has
+    from benchmark_serial_ingest import PROTOCOLS, measure_decoding, measure_ingest
+
+    for protocol_name in PROTOCOLS:
+        decoding_throughput = np.median([measure_decoding(protocol_name) for _ in range(5)])
+        results.add('serial_ingest.' + protocol_name + '.decoding_throughput', decoding_throughput, 'samples/s',
+                    'higher')
+        for sample_rate in sample_rates:
+            received_rate, lost_fraction, cpu_load = measure_ingest(protocol_name, sample_rate, duration)
+            name = 'serial_ingest.' + protocol_name + '.' + str(sample_rate) + '_hz'
+            # the received rate and the CPU load depend on the scheduling of the virtual unit's process, the lost
+            # fraction is what a slower reader shows
+            results.add(name + '.received_rate', received_rate, 'samples/s', 'higher', gated=False)
+            results.add(name + '.lost_fraction', lost_fraction, '')
+            results.add(name + '.cpu_load', cpu_load, '', gated=False)
+
+
+def run_tick_benchmarks(results, tick_count=200):
+    # imported here, so only this benchmark needs Qt and a canvas
+    from benchmark_tick import PLOT_BACKENDS, measure_ticks
+
+    for plot_backend_name in PLOT_BACKENDS:
+        processing_times, tick_times = measure_ticks(plot_backend_name, tick_count=tick_count)
+        name = 'tick.' + plot_backend_name
+        # a processing step of a frame takes a fraction of a millisecond
+        results.add(name + '.processing_time.median', np.median(processing_times), 's', gated=False)
+        results.add(name + '.tick_time.median', np.median(tick_times), 's')
+        results.add(name + '.tick_time.p95', np.percentile(tick_times, 95), 's', gated=False)
+
+
+def run_memory_benchmarks(results):
+    results.add('memory.live_measurement_per_hour', measure_memory_per_hour(), 'B')
+    results.add('memory.binary_recording_per_hour', measure_recording_size_per_hour(), 'B')
+
+
+def find_regressions(results, baseline_results, tolerance, timing_tolerance, fraction_tolerance):
+    baseline_values = {result['name']: result['value'] for result in baseline_results}
+    # how much slower this machine ran the reference workload than the baseline's, 1 without a reference in either
+    reference_time = {result['name']: result['value'] for result in results}.get(REFERENCE_RESULT_NAME)
+    baseline_reference_time = baseline_values.get(REFERENCE_RESULT_NAME)
+    slowdown = reference_time / baseline_reference_time if reference_time and baseline_reference_time else 1
+
+    regressions = []
+    for result in results:
+        baseline_value = baseline_values.get(result['name'])
+        if baseline_value is None or not result['gated']:
+            continue
+        value = result['value']
+        if result['unit'] in TIMING_UNITS:
+            # how many times slower than the baseline would have been on this machine
+            if result['better'] == 'higher':
+                relative_time = baseline_value / slowdown / value if value else float('inf')
+            else:
+                relative_time = value / (baseline_value * slowdown)
+            is_regression = relative_time > 1 + timing_tolerance
+        elif not result['unit']:
+            is_regression = value > baseline_value + fraction_tolerance
+        elif result['better'] == 'higher':
+            is_regression = value < baseline_value * (1 - tolerance)
+        else:
+            is_regression = value > baseline_value * (1 + tolerance)
+        if is_regression:
+            regressions.append((result['name'], baseline_value, result['value'], result['unit']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite and write the results as JSON.")
+    parser.add_argument("--benchmarks", nargs="+", choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument("-o", "--output", help="result file, standard output if not given")
+    parser.add_argument("--compare", help="result file of an earlier run to check for regressions against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="relative growth of a size that counts as a regression when comparing")
+    parser.add_argument("--timing-tolerance", type=float, default=0.5,
+                        help="relative slowdown of a timing, against the reference workload, that counts as a "
+                             "regression when comparing")
+    parser.add_argument("--fraction-tolerance", type=float, default=0.001,
+                        help="absolute growth of a fraction that counts as a regression when comparing")
+    args = parser.parse_args()
+
+    results = BenchmarkResults()
+    # timed before and after the benchmarks, the mean of both is what the machine was like while they ran
+    reference_time = get_median_time(run_reference_workload, min_duration=1)
+    for benchmark in args.benchmarks:
+        match benchmark:
+            case 'load_file':
+                run_load_file_benchmarks(results)
+            case 'r_peak_detection':
+                run_r_peak_detection_benchmarks(results)
+            case 'serial_ingest':
+                run_serial_ingest_benchmarks(results)
+            case 'tick':
+                run_tick_benchmarks(results)
+            case 'memory':
+                run_memory_benchmarks(results)
+    reference_time = (reference_time + get_median_time(run_reference_workload, min_duration=1)) / 2
+    results.add(REFERENCE_RESULT_NAME, reference_time, 's', gated=False)
+
+    document = {'environment': get_environment(), 'results': results.results}
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(document, output_file, indent=1)
+    else:
+        json.dump(document, sys.stdout, indent=1)
+        print()
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = find_regressions(results.results, json.load(baseline_file)['results'], args.tolerance,
+                                           args.timing_tolerance, args.fraction_tolerance)
+        for name, baseline_value, value, unit in regressions:
+            print(f"Regression in {name}: {baseline_value:.6g} -> {value:.6g} {unit}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+import multiprocessing
+from multiprocessing import shared_memory
+
+from ecg_buffers import SpscRingBuffer
+from ecg_files import RecordingWriter
+from ecg_instrumentation import instrumentation
+from ecg_serial import SerialReader
+
+
+class AcquisitionMode:
+    THREAD = 1  # the serial reader is a thread of the GUI process
+    PROCESS = 2  # the serial reader runs in its own process, see AcquisitionProcess
+
+
+class AcquisitionProcess:
+
+    # A SerialReader in a child process, so a GUI process that holds the GIL (e.g. while drawing) can never delay a read
+    # and let the operating system's serial buffer overflow. The samples are pushed into an SpscRingBuffer in a shared
+    # memory block that this process maps as well, so the processing worker drains them without any copying or
+    # pickling. Everything else has the SerialReader interface and is forwarded to the child over a pipe.
+    def __init__(self, serial_protocol, capacity=2 ** 16):
+        self.serial_protocol = serial_protocol
+        self.capacity = capacity
+        self.shared_memory = shared_memory.SharedMemory(create=True,
+                                                        size=SpscRingBuffer.get_memory_size(capacity))
+        self.sample_queue = SpscRingBuffer(capacity, memory=self.shared_memory.buf)
+        self.recording_writer = None
+        self.connection = None
+        self.process = None
+        self.performance_report = None  # the child's instrumentation report, if it was enabled
+
+    def start(self):
+        self.connection, child_connection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=run_acquisition_process, name="serial-acquisition", daemon=True,
+            args=(child_connection, self.shared_memory.name, self.capacity, self.serial_protocol[0],
+                  instrumentation.enabled))
+        self.process.start()
+
+    def stop(self):
+        if self.process:
+            self.performance_report = self.call('stop')
+            self.process.join()
+            self.process = None
+        self.shared_memory.unlink()
+
+    def call(self, method_name, *args):
+        # runs the method of the SerialReader in the child and waits for it, exceptions are raised here again
+        self.connection.send((method_name, args))
+        is_successful, result = self.connection.recv()
+        if not is_successful:
+            raise result
+        return result
+
+    def open_port(self, serial_port, baud_rate):
+        self.call('open_port', serial_port, baud_rate)
+
+    def close_port(self):
+        self.call('close_port')
+
+    def write(self, data):
+        self.call('write', data)
+
+    def start_measurement(self):
+        self.call('start_measurement')
+
+    def stop_measurement(self):
+        self.call('stop_measurement')
+
+    def get_statistics(self):
+        return self.call('get_statistics')
+
+    def start_recording(self, recording_writer):
+        # the writer cannot be shared with the child, an equal one is started there instead
+        self.call('start_recording', recording_writer.filename_with_path, recording_writer.sample_rate,
+                  recording_writer.start_timestamp)
+        self.recording_writer = recording_writer
+
+    def stop_recording(self):
+        recording_writer = self.recording_writer
+        self.recording_writer = None
+        written_sample_count, dropped_sample_count, error = self.call('stop_recording')
+        if recording_writer:
+            recording_writer.written_sample_count = written_sample_count
+            recording_writer.dropped_sample_count = dropped_sample_count
+            recording_writer.error = error
+        return recording_writer
+
+
+def run_acquisition_process(connection, shared_memory_name, capacity, serial_protocol, is_instrumentation_enabled):
+    instrumentation.enabled = is_instrumentation_enabled
+    memory = shared_memory.SharedMemory(name=shared_memory_name)
+    serial_reader = SerialReader(SpscRingBuffer(capacity, memory=memory.buf), [serial_protocol])
+    serial_reader.start()
+
+    while True:
+        method_name, args = connection.recv()
+        try:
+            match method_name:
+                case 'start_recording':
+                    result = serial_reader.start_recording(RecordingWriter(*args))
+                case 'stop_recording':
+                    recording_writer = serial_reader.stop_recording()
+                    result = (0, 0, None)
+                    if recording_writer:
+                        result = (recording_writer.written_sample_count, recording_writer.dropped_sample_count,
+                                  recording_writer.error)
+                case 'stop':
+                    # also finishes a recording that is still running
+                    serial_reader.stop()
+                    result = instrumentation.format_report() if instrumentation.enabled else None
+                case _:
+                    result = getattr(serial_reader, method_name)(*args)
+        except Exception as error:
+            connection.send((False, error))
+        else:
+            connection.send((True, result))
+        if method_name == 'stop':
+            break
@@ -0,0 +1,181 @@
+import statistics
+
+import numpy as np
+
+from ecg_instrumentation import instrumentation
+
+# the default R peak hysteresis, in ADC units: a peak is detected above the upper threshold, the next one only after
+# the signal went below the lower threshold
+R_PEAK_UPPER_THRESHOLD = 2600
+R_PEAK_LOWER_THRESHOLD = 2000
+
+# below this many samples the NumPy call overhead outweighs the gain, so the short live chunks use the plain loop
+VECTORIZED_DETECTION_MIN_LENGTH = 1000
+
+
+# Every detector takes the hysteresis state left by the previous call (whether a new R peak may be detected and the
+# number of samples since the last R peak) and returns the sample counts between R peaks together with the new state.
+# The last sample is only used as the right neighbour of the one before it, exactly like the original loop did.
+def detect_r_peaks(ecg_data, upper_threshold, lower_threshold, r_peak_detectable=True, r_peak_interval_counter=0):
+    if len(ecg_data) >= VECTORIZED_DETECTION_MIN_LENGTH:
+        return detect_r_peaks_vectorized(ecg_data, upper_threshold, lower_threshold, r_peak_detectable,
+                                         r_peak_interval_counter)
+    return detect_r_peaks_loop(ecg_data, upper_threshold, lower_threshold, r_peak_detectable, r_peak_interval_counter)
+
+
+def detect_r_peaks_loop(ecg_data, upper_threshold, lower_threshold, r_peak_detectable=True, r_peak_interval_counter=0):
+    # plain ints are much faster to index and compare in a Python loop than NumPy scalars
+    if isinstance(ecg_data, np.ndarray):
+        ecg_data = ecg_data.tolist()
+
+    r_peak_intervals = []
+    for i in range(len(ecg_data) - 1):
+        r_peak_interval_counter += 1
+        if r_peak_detectable and ecg_data[i] > upper_threshold and ecg_data[i] > ecg_data[i + 1]:
+            r_peak_intervals.append(r_peak_interval_counter)
+            r_peak_interval_counter = 0
+            r_peak_detectable = False
+        elif ecg_data[i] < lower_threshold:
+            r_peak_detectable = True
+    return r_peak_intervals, r_peak_detectable, r_peak_interval_counter
+
+
+def detect_r_peaks_vectorized(ecg_data, upper_threshold, lower_threshold, r_peak_detectable=True,
+                              r_peak_interval_counter=0):
+    ecg_data = np.asarray(ecg_data)
+    processed_count = len(ecg_data) - 1
+    if processed_count < 1:
+        return [], r_peak_detectable, r_peak_interval_counter
+
+    processed_data = ecg_data[:processed_count]
+    candidate_indices = np.flatnonzero((processed_data > upper_threshold) & (processed_data > ecg_data[1:]))
+    low_mask = processed_data < lower_threshold
+    low_indices = np.flatnonzero(low_mask)
+
+    # A sample below the lower threshold makes detection possible again and only a detected R peak disables it, so
+    # exactly the first candidate after each low sample is an R peak. Candidates before the first low sample of the
+    # chunk depend on the state carried over from the previous call.
+    last_low_indices = np.maximum.accumulate(np.where(low_mask, np.arange(processed_count), -1))
+    candidate_last_low_indices = last_low_indices[candidate_indices]
+    first_after_low = np.empty(len(candidate_indices), dtype=bool)
+    first_after_low[:1] = True
+    first_after_low[1:] = candidate_last_low_indices[1:] != candidate_last_low_indices[:-1]
+    if not r_peak_detectable:
+        first_after_low &= candidate_last_low_indices >= 0
+    peak_indices = candidate_indices[first_after_low]
+
+    last_peak_index = peak_indices[-1] if len(peak_indices) else -1
+    last_low_index = low_indices[-1] if len(low_indices) else -1
+    if last_peak_index >= 0 or last_low_index >= 0:
+        r_peak_detectable = bool(last_low_index > last_peak_index)
+
+    r_peak_intervals = np.diff(peak_indices, prepend=-1 - r_peak_interval_counter).tolist()
+    if len(peak_indices):
+        r_peak_interval_counter = int(processed_count - 1 - last_peak_index)
+    else:
+        r_peak_interval_counter += processed_count
+    return r_peak_intervals, r_peak_detectable, r_peak_interval_counter
+
+
+class RPeakDetector:
+
+    # Streaming front end of detect_r_peaks. The last sample of every chunk is held back until the next chunk brings
+    # its right neighbour, so the detected R peaks do not depend on how the signal is split into chunks and are the
+    # same as detecting them on the whole signal at once.
+    def __init__(self, upper_threshold, lower_threshold, max_chunk_size=2 ** 20):
+        self.upper_threshold = upper_threshold
+        self.lower_threshold = lower_threshold
+        self.max_chunk_size = max_chunk_size  # bounds the temporary arrays of the vectorized detector
+        self.r_peak_detectable = True
+        self.r_peak_interval_counter = 0
+        self.processed_count = 0
+        self.pending_sample = None
+
+    def reset(self):
+        self.r_peak_detectable = True
+        self.r_peak_interval_counter = 0
+        self.processed_count = 0
+        self.pending_sample = None
+
+    @property
+    def last_r_peak_index(self):
+        # -1 before the first R peak, which makes the first interval count from the start of the signal
+        return self.processed_count - 1 - self.r_peak_interval_counter
+
+    def process(self, samples):
+        samples = np.asarray(samples)
+        if len(samples) == 0:
+            return np.empty(0, dtype=np.int64)
+        if len(samples) > self.max_chunk_size:
+            return np.concatenate([self.process(samples[i:i + self.max_chunk_size])
+                                   for i in range(0, len(samples), self.max_chunk_size)])
+        if self.pending_sample is not None:
+            samples = np.concatenate((self.pending_sample, samples))
+
+        first_r_peak_index = self.last_r_peak_index
+        r_peak_intervals, self.r_peak_detectable, self.r_peak_interval_counter = detect_r_peaks(
+            samples, self.upper_threshold, self.lower_threshold, self.r_peak_detectable, self.r_peak_interval_counter)
+        self.processed_count += len(samples) - 1
+        self.pending_sample = samples[-1:].copy()
+        return first_r_peak_index + np.cumsum(r_peak_intervals, dtype=np.int64)
+
+
+class ProcessingResult:
+
+    # The outcome of one processing step. It only carries totals, so the GUI can drop a result that arrives after a
+    # newer one without losing anything.
+    def __init__(self, processed_sample_count, r_peak_count, rr_interval, bpm):
+        self.processed_sample_count = processed_sample_count
+        self.r_peak_count = r_peak_count
+        self.rr_interval = rr_interval  # seconds, None until the first R-R interval
+        self.bpm = bpm  # None until the first whole second
+
+
+class EcgProcessor:
+
+    # The analysis of a growing recording: R peak detection, the R-R intervals and, if one is given, the min/max pyramid
+    # of the samples for the plot. process() continues from where the previous call stopped and must only be called
+    # from one thread at a time.
+    def __init__(self, ecg_data, sampling_time, r_peak_upper_threshold=R_PEAK_UPPER_THRESHOLD,
+                 r_peak_lower_threshold=R_PEAK_LOWER_THRESHOLD, min_max_pyramid=None):
+        self.ecg_data = ecg_data
+        # milliseconds, may be changed at any time (e.g. to follow an estimate of the real sample rate), the intervals
+        # are kept in samples and only converted for the result
+        self.sampling_time = sampling_time
+        self.r_peak_detector = RPeakDetector(r_peak_upper_threshold, r_peak_lower_threshold)
+        self.min_max_pyramid = min_max_pyramid
+        self.r_peak_intervals = []  # stores the samples between R peaks
+        self.processed_sample_count = 0
+
+    def reset(self):
+        self.r_peak_detector.reset()
+        if self.min_max_pyramid is not None:
+            self.min_max_pyramid.clear()
+        self.r_peak_intervals = []
+        self.processed_sample_count = 0
+
+    def process(self, to_index=None):
+        # the store may keep growing meanwhile, so every step works on the same snapshot of the length
+        to_index = len(self.ecg_data) if to_index is None else to_index
+        if self.min_max_pyramid is not None:
+            with instrumentation.time('analysis.min_max_pyramid'):
+                self.min_max_pyramid.update(self.ecg_data, to_index)
+
+        last_r_peak_index = self.r_peak_detector.last_r_peak_index
+        with instrumentation.time('analysis.detect_r_peaks'):
+            r_peak_indices = self.r_peak_detector.process(self.ecg_data[self.processed_sample_count:to_index])
+        self.r_peak_intervals.extend(np.diff(r_peak_indices, prepend=last_r_peak_index).tolist())
+        self.processed_sample_count = to_index
+        return self.get_result()
+
+    def get_result(self):
+        sampling_time = self.sampling_time
+        rr_interval = None
+        if self.r_peak_intervals:
+            rr_interval = statistics.fmean(self.r_peak_intervals) * sampling_time * pow(10, -3)
+
+        bpm = None
+        elapsed_time = int(self.processed_sample_count * sampling_time / 1000)  # seconds
+        if elapsed_time:
+            bpm = int((len(self.r_peak_intervals) + 1) / elapsed_time * 60)
+        return ProcessingResult(self.processed_sample_count, len(self.r_peak_intervals), rr_interval, bpm)
@@ -0,0 +1,107 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from ecg_analysis import R_PEAK_LOWER_THRESHOLD, R_PEAK_UPPER_THRESHOLD, EcgProcessor
+from ecg_files import BINARY_RECORDING_EXTENSION, TEXT_RECORDING_EXTENSION, load_binary_recording, \
+    load_text_recording
+
+RECORDING_EXTENSIONS = (TEXT_RECORDING_EXTENSION, BINARY_RECORDING_EXTENSION)
+RESULT_FIELDS = ['file', 'sample_rate', 'sample_count', 'duration', 'r_peak_count', 'rr_interval', 'bpm', 'error']
+
+
+def analyze_recording(filename_with_path, sample_rate=500, r_peak_upper_threshold=R_PEAK_UPPER_THRESHOLD,
+                      r_peak_lower_threshold=R_PEAK_LOWER_THRESHOLD):
+    # the same analysis as the GUI does after loading the file, a text recording is taken to be sampled at sample_rate
+    result = dict.fromkeys(RESULT_FIELDS)
+    result['file'] = filename_with_path
+    try:
+        if filename_with_path.endswith(BINARY_RECORDING_EXTENSION):
+            header, samples = load_binary_recording(filename_with_path)
+            sample_rate = header['sample_rate']
+        else:
+            samples = load_text_recording(filename_with_path)
+        if not sample_rate > 0:
+            raise ValueError("Invalid sample rate " + str(sample_rate))
+
+        processing_result = EcgProcessor(samples, 1000 / sample_rate, r_peak_upper_threshold,
+                                         r_peak_lower_threshold).process()
+    except Exception as error:
+        # whatever goes wrong with one recording only goes into its error column, the other recordings are still
+        # analyzed and the results written
+        result['error'] = str(error) or type(error).__name__
+        return result
+
+    result.update(sample_rate=sample_rate, sample_count=len(samples), duration=len(samples) / sample_rate,
+                  r_peak_count=processing_result.r_peak_count, rr_interval=processing_result.rr_interval,
+                  bpm=processing_result.bpm)
+    return result
+
+
+def find_recordings(paths):
+    # files are taken as they are, directories are searched recursively for recordings
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for directory_path, directory_names, filenames in os.walk(path):
+            directory_names.sort()
+            for filename in sorted(filenames):
+                if filename.endswith(RECORDING_EXTENSIONS):
+                    yield os.path.join(directory_path, filename)
+
+
+def write_results(results, output_file, output_format):
+    if output_format == 'json':
+        json.dump(results, output_file, indent=1)
+        output_file.write('\n')
+    else:
+        writer = csv.DictWriter(output_file, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze ECG recordings without the GUI and write the R peak count, "
+                                                 "RR interval and BPM of every recording to CSV or JSON.")
+    parser.add_argument("paths", nargs="+", help="recordings, or directories that are searched for " +
+                                                 " and ".join(RECORDING_EXTENSIONS) + " files")
+    parser.add_argument("-o", "--output", help="result file, standard output if not given")
+    parser.add_argument("--format", choices=['csv', 'json'],
+                        help="result format, by default taken from the extension of the output file, otherwise csv")
+    parser.add_argument("--sample-rate", type=float, default=500,
+                        help="sample rate of the text recordings in hertz, binary recordings carry their own")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="number of worker processes")
+    args = parser.parse_args()
+    if not args.sample_rate > 0:
+        parser.error("the sample rate must be greater than 0")
+
+    output_format = args.format
+    if output_format is None:
+        output_format = 'json' if args.output and args.output.endswith('.json') else 'csv'
+
+    filenames = list(find_recordings(args.paths))
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        # a chunk of files per task, so the pickling round trip does not dominate for thousands of short recordings
+        chunk_size = max(1, len(filenames) // (4 * args.jobs))
+        results = list(executor.map(analyze_recording, filenames, [args.sample_rate] * len(filenames),
+                                    chunksize=chunk_size))
+
+    if args.output:
+        with open(args.output, 'w', newline='') as output_file:
+            write_results(results, output_file, output_format)
+    else:
+        write_results(results, sys.stdout, output_format)
+
+    failed_count = sum(result['error'] is not None for result in results)
+    print(str(len(results)) + " recordings analyzed in " + str(round(time.perf_counter() - start_time, 2)) + " s, "
+          + str(failed_count) + " failed", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+import numpy as np
+
+
+class RingBuffer:
+
+    # Every sample is stored twice (at index and index + capacity), so the samples in chronological order are
+    # always available as one contiguous slice and view() never has to copy or allocate a new array
+    def __init__(self, capacity, dtype=np.uint16):
+        self.capacity = capacity
+        self.buffer = np.zeros(capacity * 2, dtype=dtype)
+        self.head = 0  # index of the oldest sample, which is also the next write position
+
+    def __len__(self):
+        return self.capacity
+
+    def reset(self, values):
+        values = np.asarray(values)[-self.capacity:]
+        self.head = 0
+        self.buffer[:] = values[0] if len(values) else 0
+        self.extend(values)
+
+    def extend(self, values):
+        values = np.asarray(values)[-self.capacity:]
+        count = len(values)
+        if count == 0:
+            return
+
+        first_part_count = min(count, self.capacity - self.head)
+        self.write(self.head, values[:first_part_count])
+        self.write(0, values[first_part_count:])
+        self.head = (self.head + count) % self.capacity
+
+    def write(self, index, values):
+        self.buffer[index:index + len(values)] = values
+        self.buffer[index + self.capacity:index + self.capacity + len(values)] = values
+
+    def view(self):
+        return self.buffer[self.head:self.head + self.capacity]
+
+
+class SpscRingBuffer:
+
+    # Hands samples from one producer (the serial reader) to one consumer (the processing worker) without a lock.
+    # Memory model: write_count is only changed by the producer and read_count only by the consumer, both only grow.
+    # The producer copies samples into free slots and only then publishes them by increasing write_count, the consumer
+    # reads write_count first and only then the slots below it, and hands slots back by increasing read_count. Each
+    # count is one aligned 64 bit store into the counts array, so neither side ever sees a slot the other one is still
+    # writing: between threads the GIL orders the stores, between processes (memory is then a shared memory block) the
+    # CPU has to keep stores in order, which x86-64 does. Like in RingBuffer every sample is stored twice, so the
+    # pending samples are always one contiguous slice.
+    COUNTS_DTYPE = np.dtype([('write_count', np.int64), ('read_count', np.int64), ('overflow_count', np.int64)])
+
+    def __init__(self, capacity=2 ** 16, dtype=np.uint16, memory=None):
+        self.capacity = capacity
+        if memory is None:
+            memory = bytearray(self.get_memory_size(capacity, dtype))
+        self.counts = np.ndarray(1, dtype=self.COUNTS_DTYPE, buffer=memory)[0]
+        self.buffer = np.ndarray(capacity * 2, dtype=dtype, buffer=memory, offset=self.COUNTS_DTYPE.itemsize)
+        self.drained_count = self.read_count  # samples returned by drain(), only used by the consumer
+
+    @classmethod
+    def get_memory_size(cls, capacity, dtype=np.uint16):
+        return cls.COUNTS_DTYPE.itemsize + capacity * 2 * np.dtype(dtype).itemsize
+
+    @property
+    def write_count(self):
+        # samples published by the producer
+        return int(self.counts['write_count'])
+
+    @write_count.setter
+    def write_count(self, value):
+        self.counts['write_count'] = value
+
+    @property
+    def read_count(self):
+        # samples handed back to the producer
+        return int(self.counts['read_count'])
+
+    @read_count.setter
+    def read_count(self, value):
+        self.counts['read_count'] = value
+
+    @property
+    def overflow_count(self):
+        # samples the producer dropped because the consumer fell a whole capacity behind
+        return int(self.counts['overflow_count'])
+
+    @overflow_count.setter
+    def overflow_count(self, value):
+        self.counts['overflow_count'] = value
+
+    def __len__(self):
+        # the samples the next drain() returns, only meaningful on the consumer side
+        return self.write_count - self.drained_count
+
+    def push(self, values):
+        # producer side, the samples that do not fit are dropped and counted, the producer never waits
+        values = np.asarray(values)
+        free_count = self.capacity - (self.write_count - self.read_count)
+        if len(values) > free_count:
+            self.overflow_count += len(values) - free_count
+            values = values[:free_count]
+        count = len(values)
+        if count == 0:
+            return 0
+
+        head = self.write_count % self.capacity
+        first_part_count = min(count, self.capacity - head)
+        self.write(head, values[:first_part_count])
+        self.write(0, values[first_part_count:])
+        self.write_count += count
+        return count
+
+    def write(self, index, values):
+        self.buffer[index:index + len(values)] = values
+        self.buffer[index + self.capacity:index + self.capacity + len(values)] = values
+
+    def drain(self):
+        # consumer side, returns every pending sample as a view into the buffer without copying. The view stays valid
+        # until the next drain() or discard(), its slots are only handed back to the producer then.
+        self.read_count = self.drained_count
+        write_count = self.write_count
+        tail = self.drained_count % self.capacity
+        samples = self.buffer[tail:tail + write_count - self.drained_count]
+        self.drained_count = write_count
+        return samples
+
+    def discard(self):
+        # consumer side, drops the pending samples (e.g. the last ones of the previous measurement)
+        self.drained_count = self.write_count
+        self.read_count = self.drained_count
+
+
+class SampleStore:
+
+    # Single writer (the processing worker thread), any number of readers. The samples are written before the length is
+    # increased, and a grown buffer is swapped in before the length is increased as well, so a reader that takes the
+    # length first always finds at least that many valid samples in whatever buffer it sees afterwards
+    def __init__(self, initial_capacity=65536, dtype=np.uint16):
+        self.initial_capacity = initial_capacity
+        self.buffer = np.zeros(initial_capacity, dtype=dtype)
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, key):
+        length = self.length
+        return self.buffer[:length][key]
+
+    def extend(self, values):
+        values = np.asarray(values)
+        if len(values) == 0:
+            # nothing to add, and reserve() must not swap an assigned read-only recording for a copy
+            return
+        new_length = self.length + len(values)
+        self.reserve(new_length)
+        self.buffer[self.length:new_length] = values
+        self.length = new_length
+
+    def assign(self, samples):
+        # uses the given array (e.g. a read-only memory mapped recording) as the store without copying it
+        self.length = 0
+        self.buffer = np.asarray(samples)
+        self.length = len(samples)
+
+    def reserve(self, capacity):
+        if capacity > len(self.buffer) or not self.buffer.flags.writeable:
+            buffer = np.zeros(max(capacity, len(self.buffer) * 2), dtype=self.buffer.dtype)
+            buffer[:self.length] = self.buffer[:self.length]
+            self.buffer = buffer
+
+    def clear(self):
+        self.length = 0
+        if not self.buffer.flags.writeable:
+            self.buffer = np.zeros(self.initial_capacity, dtype=self.buffer.dtype)
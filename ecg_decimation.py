@@ -0,0 +1,93 @@
+import numpy as np
+
+from ecg_buffers import SampleStore
+
+
+# Min/max decimation: every bucket of samples is replaced by its smallest and largest sample, in the order they occur,
+# so a trace drawn from at most 2 * bucket_count points still reaches every peak and valley of the full signal.
+def decimate_min_max(xdata, ydata, bucket_count):
+    ydata = np.asarray(ydata)
+    if len(ydata) <= 2 * bucket_count:
+        return xdata, ydata
+
+    bucket_size = -(-len(ydata) // bucket_count)
+    full_bucket_count = len(ydata) // bucket_size
+    buckets = ydata[:full_bucket_count * bucket_size].reshape(full_bucket_count, bucket_size)
+    bucket_starts = np.arange(full_bucket_count) * bucket_size
+    min_indices = bucket_starts + buckets.argmin(axis=1)
+    max_indices = bucket_starts + buckets.argmax(axis=1)
+
+    remainder = ydata[full_bucket_count * bucket_size:]
+    if len(remainder):
+        remainder_start = full_bucket_count * bucket_size
+        min_indices = np.append(min_indices, remainder_start + remainder.argmin())
+        max_indices = np.append(max_indices, remainder_start + remainder.argmax())
+
+    indices = np.empty(2 * len(min_indices), dtype=np.int64)
+    indices[0::2] = np.minimum(min_indices, max_indices)
+    indices[1::2] = np.maximum(min_indices, max_indices)
+    return np.asarray(xdata)[indices], ydata[indices]
+
+
+class MinMaxPyramid:
+
+    # Level k keeps the minimum and maximum of every bucket of base_bucket_size * 2 ** k samples, each level is built
+    # from the one below it. Any range is served from the coarsest level that still has at least bucket_count buckets
+    # in it, so the work per query depends on the number of pixel columns and not on the length of the range.
+    def __init__(self, base_bucket_size=4, level_count=24):
+        self.bucket_sizes = [base_bucket_size * 2 ** level for level in range(level_count)]
+        self.mins = [SampleStore(initial_capacity=1024) for _ in range(level_count)]
+        self.maxes = [SampleStore(initial_capacity=1024) for _ in range(level_count)]
+
+    def clear(self):
+        for level in range(len(self.bucket_sizes)):
+            self.mins[level].clear()
+            self.maxes[level].clear()
+
+    def update(self, ecg_data, to_index=None):
+        # only complete buckets are added, the samples of an incomplete one are picked up by a later update
+        to_index = len(ecg_data) if to_index is None else to_index
+        base_bucket_size = self.bucket_sizes[0]
+        from_index = len(self.mins[0]) * base_bucket_size
+        bucket_count = (to_index - from_index) // base_bucket_size
+        if bucket_count <= 0:
+            return
+
+        buckets = np.asarray(ecg_data[from_index:from_index + bucket_count * base_bucket_size])
+        self.mins[0].extend(buckets.reshape(bucket_count, base_bucket_size).min(axis=1))
+        self.maxes[0].extend(buckets.reshape(bucket_count, base_bucket_size).max(axis=1))
+
+        for level in range(1, len(self.bucket_sizes)):
+            from_index = len(self.mins[level]) * 2
+            bucket_count = (len(self.mins[level - 1]) - from_index) // 2
+            if bucket_count <= 0:
+                break
+            self.mins[level].extend(
+                self.mins[level - 1][from_index:from_index + bucket_count * 2].reshape(bucket_count, 2).min(axis=1))
+            self.maxes[level].extend(
+                self.maxes[level - 1][from_index:from_index + bucket_count * 2].reshape(bucket_count, 2).max(axis=1))
+
+    def get_envelope(self, ecg_data, from_index, to_index, bucket_count):
+        # returns the x positions with the lower and upper edge of the signal there, below the finest level of the
+        # pyramid the raw samples are returned as both edges
+        samples_per_bucket = (to_index - from_index) / max(1, bucket_count)
+        level = np.searchsorted(self.bucket_sizes, samples_per_bucket, side='right') - 1
+        if level < 0:
+            ydata = ecg_data[from_index:to_index]
+            return np.arange(from_index, to_index), ydata, ydata
+
+        bucket_size = self.bucket_sizes[level]
+        first_bucket = from_index // bucket_size
+        last_bucket = max(first_bucket, min(-(-to_index // bucket_size), len(self.mins[level])))
+        xdata = np.arange(first_bucket, last_bucket) * bucket_size
+        min_ydata = self.mins[level][first_bucket:last_bucket]
+        max_ydata = self.maxes[level][first_bucket:last_bucket]
+
+        # the newest samples may not have reached this level yet, they are added as one more bucket
+        covered_to_index = max(from_index, last_bucket * bucket_size)
+        if covered_to_index < to_index:
+            remainder = ecg_data[covered_to_index:to_index]
+            xdata = np.append(xdata, covered_to_index)
+            min_ydata = np.append(min_ydata, remainder.min())
+            max_ydata = np.append(max_ydata, remainder.max())
+        return xdata, min_ydata, max_ydata
@@ -0,0 +1,205 @@
+import argparse
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+ADC_BITS = 12
+ADC_MAX_VALUE = 2 ** ADC_BITS - 1
+VOLTAGE_REFERENCE = 3.3  # volts
+
+TEXT_RECORDING_EXTENSION = ".txt"
+BINARY_RECORDING_EXTENSION = ".ecgb"
+BINARY_RECORDING_MAGIC = b"ECGB"
+BINARY_RECORDING_VERSION = 1
+# the header is followed by the raw little-endian uint16 samples up to the end of the file, so a recording that is
+# still being written is always valid and the sample count never has to be patched into the header
+BINARY_RECORDING_HEADER_DTYPE = np.dtype([('magic', 'S4'), ('version', '<u2'), ('adc_bits', '<u2'),
+                                          ('sample_rate', '<f8'), ('voltage_reference', '<f8'),
+                                          ('start_timestamp', '<f8')])
+BINARY_RECORDING_SAMPLE_DTYPE = np.dtype('<u2')
+
+# the text recording that comes with the application, sampled at EXAMPLE_RECORDING_SAMPLE_RATE
+EXAMPLE_RECORDING_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources",
+                                      "ecg_measurement_example.txt")
+EXAMPLE_RECORDING_SAMPLE_RATE = 500  # hertz
+
+
+class InvalidRecordingError(ValueError):
+
+    def __init__(self, line_number=None):
+        message = "Invalid recording" if line_number is None else "Invalid sample on line " + str(line_number)
+        super(InvalidRecordingError, self).__init__(message)
+        self.line_number = line_number
+
+
+def load_text_recording(filename_with_path, max_value=ADC_MAX_VALUE):
+    try:
+        # np.loadtxt parses in C and straight from the file, without holding all lines as Python objects. With the comma
+        # delimiter the values of a line are columns, so a line with several values is not read as one sample.
+        samples = np.loadtxt(filename_with_path, dtype=np.int32, delimiter=',', comments=None, ndmin=1)
+    except (ValueError, OverflowError):
+        samples = None
+
+    # several values on every line parse as columns of a 2-D array, and loadtxt silently skips blank lines, neither is
+    # valid in a recording
+    if samples is None or samples.ndim != 1 or len(samples) != count_lines(filename_with_path):
+        raise InvalidRecordingError(find_first_invalid_line_number(filename_with_path, max_value))
+
+    invalid_indices = np.flatnonzero((samples < 0) | (samples > max_value))
+    if len(invalid_indices):
+        raise InvalidRecordingError(int(invalid_indices[0]) + 1)
+    return samples.astype(np.uint16)
+
+
+def count_lines(filename_with_path, chunk_size=2 ** 20):
+    line_count = 0
+    last_byte = b'\n'
+    with open(filename_with_path, 'rb') as file:
+        while chunk := file.read(chunk_size):
+            line_count += chunk.count(b'\n')
+            last_byte = chunk[-1:]
+    # a last line without a line break is still a line
+    return line_count + (last_byte != b'\n')
+
+
+def find_first_invalid_line_number(filename_with_path, max_value=ADC_MAX_VALUE):
+    with open(filename_with_path, 'rb') as file:
+        for line_number, line in enumerate(file, start=1):
+            try:
+                if 0 <= int(line) <= max_value:
+                    continue
+            except ValueError:
+                pass
+            return line_number
+    return None
+
+
+def create_binary_recording_header(sample_rate, start_timestamp, adc_bits=ADC_BITS,
+                                   voltage_reference=VOLTAGE_REFERENCE):
+    header = np.zeros(1, dtype=BINARY_RECORDING_HEADER_DTYPE)
+    header['magic'] = BINARY_RECORDING_MAGIC
+    header['version'] = BINARY_RECORDING_VERSION
+    header['adc_bits'] = adc_bits
+    header['sample_rate'] = sample_rate
+    header['voltage_reference'] = voltage_reference
+    header['start_timestamp'] = start_timestamp
+    return header
+
+
+def write_binary_recording(filename_with_path, samples, sample_rate, start_timestamp, adc_bits=ADC_BITS,
+                           voltage_reference=VOLTAGE_REFERENCE):
+    with open(filename_with_path, 'wb') as file:
+        file.write(create_binary_recording_header(sample_rate, start_timestamp, adc_bits, voltage_reference).tobytes())
+        file.write(np.asarray(samples, dtype=BINARY_RECORDING_SAMPLE_DTYPE).tobytes())
+
+
+def load_binary_recording(filename_with_path):
+    header = np.fromfile(filename_with_path, dtype=BINARY_RECORDING_HEADER_DTYPE, count=1)
+    if len(header) != 1 or header['magic'][0] != BINARY_RECORDING_MAGIC \
+            or header['version'][0] != BINARY_RECORDING_VERSION:
+        raise InvalidRecordingError()
+
+    # memory mapped, so only the pages that are actually displayed or processed are read from disk
+    sample_count = (os.path.getsize(filename_with_path) - header.itemsize) // BINARY_RECORDING_SAMPLE_DTYPE.itemsize
+    if sample_count:
+        samples = np.memmap(filename_with_path, dtype=BINARY_RECORDING_SAMPLE_DTYPE, mode='r', offset=header.itemsize,
+                            shape=(sample_count,))
+    else:
+        samples = np.empty(0, dtype=BINARY_RECORDING_SAMPLE_DTYPE)
+    return {name: header[name][0].item() for name in header.dtype.names}, samples
+
+
+def convert_text_to_binary_recording(text_filename_with_path, binary_filename_with_path, sample_rate,
+                                     start_timestamp=None):
+    samples = load_text_recording(text_filename_with_path)
+    if start_timestamp is None:
+        # the text format has no start time, the modification time of the file is the closest guess
+        start_timestamp = os.path.getmtime(text_filename_with_path) - len(samples) / sample_rate
+    write_binary_recording(binary_filename_with_path, samples, sample_rate, start_timestamp)
+
+
+class RecordingWriter:
+
+    # Writes a live measurement to disk on its own thread. write() never blocks: the samples go through a bounded queue
+    # and are dropped (and counted) if the disk cannot keep up, so the serial reader and the Qt timer never wait for I/O.
+    # Only start() raises, a failed write or close (e.g. a full disk) is kept in error and everything from then on is
+    # discarded, so the queue keeps draining and stop() always returns.
+    def __init__(self, filename_with_path, sample_rate, start_timestamp=None, queue_size=1024, buffer_size=2 ** 20):
+        self.filename_with_path = filename_with_path
+        self.sample_rate = sample_rate
+        self.start_timestamp = start_timestamp
+        self.buffer_size = buffer_size
+        self.is_binary = filename_with_path.endswith(BINARY_RECORDING_EXTENSION)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped_sample_count = 0
+        self.written_sample_count = 0
+        self.error = None  # the OSError that ended the writing
+        self.file = None
+        self.thread = None
+
+    def start(self):
+        self.file = open(self.filename_with_path, 'wb', buffering=self.buffer_size)
+        if self.is_binary:
+            start_timestamp = time.time() if self.start_timestamp is None else self.start_timestamp
+            try:
+                self.file.write(create_binary_recording_header(self.sample_rate, start_timestamp).tobytes())
+            except OSError:
+                self.file.close()
+                raise
+        self.thread = threading.Thread(target=self.run, name="recording-writer", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread:
+            if self.thread.is_alive():
+                self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+            try:
+                # flushes the buffer, which is where a full disk shows up most of the time
+                self.file.close()
+            except OSError as error:
+                self.error = self.error or error
+
+    def write(self, samples):
+        if len(samples) == 0:
+            return
+        try:
+            # copied, the caller's buffer may be reused before the writer thread gets to it
+            self.queue.put_nowait(np.array(samples, dtype=BINARY_RECORDING_SAMPLE_DTYPE))
+        except queue.Full:
+            self.dropped_sample_count += len(samples)
+
+    def run(self):
+        while (samples := self.queue.get()) is not None:
+            if self.error:
+                continue
+            try:
+                if self.is_binary:
+                    self.file.write(samples.tobytes())
+                else:
+                    np.savetxt(self.file, samples, fmt='%d')
+            except OSError as error:
+                self.error = error
+                continue
+            self.written_sample_count += len(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert text ECG recordings to the binary " +
+                                                 BINARY_RECORDING_EXTENSION + " format.")
+    parser.add_argument("text_files", nargs="+")
+    parser.add_argument("--sample-rate", type=float, default=500, help="sample rate of the recordings in hertz")
+    args = parser.parse_args()
+
+    for text_filename_with_path in args.text_files:
+        binary_filename_with_path = os.path.splitext(text_filename_with_path)[0] + BINARY_RECORDING_EXTENSION
+        convert_text_to_binary_recording(text_filename_with_path, binary_filename_with_path, args.sample_rate)
+        print(text_filename_with_path + " -> " + binary_filename_with_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+import math
+import time
+
+# the histogram bins are spaced logarithmically, this many per decade from HISTOGRAM_MIN_VALUE up, so a percentile is
+# known to within about 12 % of its value over the whole range from a microsecond to minutes
+HISTOGRAM_BINS_PER_DECADE = 20
+HISTOGRAM_MIN_VALUE = 1e-6  # seconds
+HISTOGRAM_BIN_COUNT = 8 * HISTOGRAM_BINS_PER_DECADE
+
+
+class Histogram:
+
+    # Counts of durations in logarithmic bins, fixed in size however many durations are added. Only one thread may add
+    # to a histogram, any thread may read it (a reader may miss the very latest addition).
+    def __init__(self):
+        self.bin_counts = [0] * HISTOGRAM_BIN_COUNT
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def add(self, value):
+        if value > HISTOGRAM_MIN_VALUE:
+            bin_index = min(int(math.log10(value / HISTOGRAM_MIN_VALUE) * HISTOGRAM_BINS_PER_DECADE),
+                            HISTOGRAM_BIN_COUNT - 1)
+        else:
+            bin_index = 0
+        self.bin_counts[bin_index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.maximum:
+            self.maximum = value
+
+    def copy(self):
+        histogram = Histogram()
+        histogram.bin_counts = list(self.bin_counts)
+        histogram.count = self.count
+        histogram.total = self.total
+        histogram.maximum = self.maximum
+        return histogram
+
+    def get_percentile(self, percent, baseline=None):
+        # the upper edge of the bin the percentile falls into, None without values. With a baseline (an earlier copy of
+        # this histogram) only the values added since then are taken.
+        bin_counts = self.bin_counts
+        if baseline is not None:
+            bin_counts = [count - baseline_count for count, baseline_count in zip(bin_counts, baseline.bin_counts)]
+        count = sum(bin_counts)
+        if count == 0:
+            return None
+
+        rank = math.ceil(count * percent / 100)
+        cumulative_count = 0
+        for bin_index, bin_count in enumerate(bin_counts):
+            cumulative_count += bin_count
+            if cumulative_count >= max(rank, 1):
+                return min(HISTOGRAM_MIN_VALUE * 10 ** ((bin_index + 1) / HISTOGRAM_BINS_PER_DECADE), self.maximum)
+        return self.maximum
+
+
+class Timer:
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.start_time = 0
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.histogram.add(time.perf_counter() - self.start_time)
+        return False
+
+
+class DisabledTimer:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+DISABLED_TIMER = DisabledTimer()
+
+
+class Instrumentation:
+
+    # Timers and counters of the hot paths of a live measurement, collected by name. Disabled (the default) a timer is
+    # a shared object that does nothing and a counter is not touched, so the instrumented code only pays for one
+    # attribute check. Each name is meant to be updated from one thread only: the serial reader, the processing worker
+    # or the GUI thread.
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.histograms = {}
+        self.counters = {}
+        self.start_time = time.monotonic()
+
+    def get_histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        return histogram
+
+    def time(self, name):
+        # with instrumentation.time('name'): ... adds the duration of the block to the histogram of the name
+        if not self.enabled:
+            return DISABLED_TIMER
+        return Timer(self.get_histogram(name))
+
+    def add_time(self, name, duration):
+        # for code that measures its duration anyway
+        if self.enabled:
+            self.get_histogram(name).add(duration)
+
+    def count(self, name, value=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def format_report(self):
+        elapsed_time = time.monotonic() - self.start_time
+        lines = ["Performance statistics over " + str(round(elapsed_time, 1)) + " s"]
+        for name, histogram in sorted(self.histograms.items()):
+            if histogram.count == 0:
+                continue
+            lines.append(f"  {name}: {histogram.count} calls, mean {histogram.total / histogram.count * 1000:.3f} ms, "
+                         f"p50 {histogram.get_percentile(50) * 1000:.3f} ms, "
+                         f"p99 {histogram.get_percentile(99) * 1000:.3f} ms, max {histogram.maximum * 1000:.3f} ms")
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"  {name}: {value} ({value / elapsed_time:.1f} per second)")
+        return "\n".join(lines)
+
+
+# the instrumentation of this process, enabled by the GUI settings or by whatever script wants the statistics
+instrumentation = Instrumentation()
@@ -0,0 +1,108 @@
+import matplotlib
+import numpy as np
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.figure import Figure
+from matplotlib.patches import Polygon
+
+from ecg_plotting import get_padded_limits
+
+matplotlib.use('Qt5Agg')
+
+
+class MplCanvas(FigureCanvas):
+
+    # Blitting renderer: the animated artists are left out of full redraws, the rest of the figure is cached after every
+    # full redraw and a frame only restores that cache and draws the animated artists on top of it
+    def __init__(self, width=30, height=12, dpi=50, font_size=20):
+        fig = Figure(figsize=(width, height), dpi=dpi)
+        self.axes = fig.add_subplot(111)
+        super(MplCanvas, self).__init__(fig)
+
+        self.font_size = font_size
+        self.axes.tick_params(axis='both', labelsize=font_size)
+        self.line = None
+        self.envelope = None
+
+        self.animated_artists = []
+        self.background = None
+        self.mpl_connect('draw_event', self.on_draw)
+
+    def set_labels(self, x_label, y_label):
+        self.axes.set_xlabel(x_label, fontsize=self.font_size)
+        self.axes.set_ylabel(y_label, fontsize=self.font_size)
+        self.invalidate_background()
+
+    def set_limits(self, x_min, x_max, y_min, y_max):
+        self.axes.set_xlim(*get_padded_limits(x_min, x_max))
+        self.axes.set_ylim(*get_padded_limits(y_min, y_max))
+        self.invalidate_background()
+
+    def set_x_ticks(self, ticks, labels):
+        self.axes.set_xticks(ticks)
+        self.axes.set_xticklabels(labels)
+        self.invalidate_background()
+
+    def set_y_ticks(self, ticks, labels):
+        self.axes.set_yticks(ticks)
+        self.axes.set_yticklabels(labels)
+        self.invalidate_background()
+
+    def set_data(self, xdata, ydata):
+        if self.line is None:
+            plot_refs = self.axes.plot(xdata, ydata, 'r')
+            self.line = plot_refs[0]
+            self.add_animated_artist(self.line)
+        else:
+            self.line.set_data(xdata, ydata)
+            self.line.set_visible(True)
+        if self.envelope is not None:
+            self.envelope.set_visible(False)
+
+    def set_envelope(self, xdata, min_ydata, max_ydata):
+        if min_ydata is max_ydata:
+            self.set_data(xdata, min_ydata)
+            return
+
+        # Agg fills the band along its outline many times faster than it strokes a zigzag between the edges
+        outline = np.column_stack((np.concatenate((xdata, xdata[::-1])), np.concatenate((max_ydata, min_ydata[::-1]))))
+        if self.envelope is None:
+            self.envelope = Polygon(outline, closed=True, color='r', linewidth=1.5)
+            self.axes.add_patch(self.envelope)
+            self.add_animated_artist(self.envelope)
+        else:
+            self.envelope.set_xy(outline)
+            self.envelope.set_visible(True)
+        if self.line is not None:
+            self.line.set_visible(False)
+
+    def redraw(self):
+        self.update_animated_artists()
+
+    def add_animated_artist(self, artist):
+        artist.set_animated(True)
+        self.animated_artists.append(artist)
+        self.invalidate_background()
+
+    def invalidate_background(self):
+        self.background = None
+
+    def on_draw(self, event):
+        self.background = self.copy_from_bbox(self.figure.bbox)
+        self.draw_animated_artists()
+
+    def draw_animated_artists(self):
+        for artist in self.animated_artists:
+            self.figure.draw_artist(artist)
+
+    def resizeEvent(self, event):
+        self.invalidate_background()
+        super(MplCanvas, self).resizeEvent(event)
+
+    def update_animated_artists(self):
+        if self.background is None:
+            # a full redraw, which captures the new background through on_draw
+            self.draw()
+        else:
+            self.restore_region(self.background)
+            self.draw_animated_artists()
+            self.blit(self.figure.bbox)
@@ -0,0 +1,35 @@
+class FramePacer:
+
+    # Paces a Qt timer driven tick loop. The interval until the next tick is chosen from the measured cost of the ticks:
+    # as long as a tick is cheap the loop runs at target_fps, when ticks get expensive the interval grows so that ticks
+    # take at most max_load of the GUI thread and input events and repaints still get their turn.
+    def __init__(self, target_fps=30, max_load=0.5, smoothing=0.2):
+        self.target_fps = target_fps
+        self.max_load = max_load
+        self.smoothing = smoothing
+        self.tick_cost = 0  # seconds
+        self.last_tick_cost = 0  # seconds
+
+    def reset(self):
+        self.tick_cost = 0
+        self.last_tick_cost = 0
+
+    def set_target_fps(self, target_fps):
+        self.target_fps = target_fps
+
+    def add_tick_cost(self, tick_cost):
+        # a slower tick is taken over at once, a faster one only gradually, so a single cheap tick does not bring back a
+        # rate the machine cannot keep up with
+        if tick_cost > self.tick_cost:
+            self.tick_cost = tick_cost
+        else:
+            self.tick_cost += (tick_cost - self.tick_cost) * self.smoothing
+        self.last_tick_cost = tick_cost
+
+    def get_fps(self):
+        return 1 / max(1 / self.target_fps, self.tick_cost / self.max_load)
+
+    def get_interval(self):
+        # milliseconds from the end of the last tick to the start of the next one
+        idle_time = 1 / self.get_fps() - self.last_tick_cost
+        return max(1, round(idle_time * 1000))
@@ -0,0 +1,157 @@
+import numpy as np
+from PyQt5.QtCore import Qt, QPointF, QRectF
+from PyQt5.QtGui import QColor, QFont, QPainter, QPen, QPolygonF
+from PyQt5.QtWidgets import QWidget
+
+from ecg_instrumentation import instrumentation
+
+
+class PlotBackendCode:
+    MATPLOTLIB = 1
+    PAINTER = 2
+
+
+# Both canvases are QWidgets with the same plotting methods, EcgWindow only uses these:
+#   set_labels(x_label, y_label), set_limits(x_min, x_max, y_min, y_max), set_x_ticks(ticks, labels),
+#   set_y_ticks(ticks, labels), set_data(xdata, ydata), set_envelope(xdata, min_ydata, max_ydata) and redraw()
+# set_data draws a trace, set_envelope draws decimated data: the band between a lower and an upper edge at every x. When
+# both edges are the same array the envelope is just a trace.
+def create_canvas(plot_backend_code):
+    match plot_backend_code:
+        case PlotBackendCode.PAINTER:
+            return PainterCanvas()
+        case _:
+            # matplotlib takes most of the start up time, so it is only imported when its canvas is used
+            from ecg_mpl_canvas import MplCanvas
+            return MplCanvas()
+
+
+# like matplotlib's autoscaling, the data limits are padded by this fraction of the data range on every side
+LIMIT_MARGIN = 0.05
+
+
+def get_padded_limits(minimum, maximum):
+    margin = (maximum - minimum) * LIMIT_MARGIN
+    return minimum - margin, maximum + margin
+
+
+class PainterCanvas(QWidget):
+
+    # Draws the axes and the trace directly with QPainter. The trace is a QPolygonF whose point array is written by
+    # NumPy through a buffer view, so a frame costs one vectorized coordinate transform and one drawPolyline call.
+    def __init__(self, font_pixel_size=14, margins=(100, 20, 30, 70)):
+        super(PainterCanvas, self).__init__()
+
+        self.font = QFont()
+        self.font.setPixelSize(font_pixel_size)
+        self.margins = margins  # left, top, right, bottom
+        self.x_label = ""
+        self.y_label = ""
+        self.x_limits = (0, 1)
+        self.y_limits = (0, 1)
+        self.x_ticks = ([], [])
+        self.y_ticks = ([], [])
+        self.xdata = np.zeros(0)
+        self.ydata = np.zeros(0)
+
+        self.polygon = QPolygonF()
+        self.polygon_points = np.zeros((0, 2))
+        # a one pixel cosmetic pen takes Qt's fast line drawing path, wider pens go through the much slower stroker
+        self.trace_pen = QPen(QColor(255, 0, 0))
+        self.trace_pen.setWidth(1)
+        self.trace_pen.setCosmetic(True)
+
+        self.setAttribute(Qt.WA_OpaquePaintEvent)
+
+    def set_labels(self, x_label, y_label):
+        self.x_label = x_label
+        self.y_label = y_label
+
+    def set_limits(self, x_min, x_max, y_min, y_max):
+        self.x_limits = get_padded_limits(x_min, x_max)
+        self.y_limits = get_padded_limits(y_min, y_max)
+
+    def set_x_ticks(self, ticks, labels):
+        self.x_ticks = (ticks, labels)
+
+    def set_y_ticks(self, ticks, labels):
+        self.y_ticks = (ticks, labels)
+
+    def set_data(self, xdata, ydata):
+        self.xdata = xdata
+        self.ydata = ydata
+
+    def set_envelope(self, xdata, min_ydata, max_ydata):
+        if min_ydata is max_ydata:
+            self.set_data(xdata, min_ydata)
+            return
+
+        # a zigzag between the edges, with the cosmetic pen that is cheaper than filling the band
+        self.xdata = np.repeat(xdata, 2)
+        self.ydata = np.empty(2 * len(min_ydata), dtype=min_ydata.dtype)
+        self.ydata[0::2] = min_ydata
+        self.ydata[1::2] = max_ydata
+
+    def redraw(self):
+        self.update()
+
+    def get_plot_rect(self):
+        left, top, right, bottom = self.margins
+        return QRectF(self.rect()).adjusted(left, top, -right, -bottom)
+
+    def map_x(self, plot_rect, x):
+        return plot_rect.left() + (x - self.x_limits[0]) * plot_rect.width() / (self.x_limits[1] - self.x_limits[0])
+
+    def map_y(self, plot_rect, y):
+        return plot_rect.bottom() - (y - self.y_limits[0]) * plot_rect.height() / (self.y_limits[1] - self.y_limits[0])
+
+    def update_polygon(self, plot_rect):
+        point_count = len(self.ydata)
+        if self.polygon.size() != point_count:
+            self.polygon = QPolygonF()
+            self.polygon.fill(QPointF(), point_count)
+            pointer = self.polygon.data()
+            pointer.setsize(point_count * 2 * np.dtype(np.float64).itemsize)
+            self.polygon_points = np.frombuffer(pointer, dtype=np.float64).reshape(point_count, 2)
+        self.polygon_points[:, 0] = self.map_x(plot_rect, np.asarray(self.xdata, dtype=np.float64))
+        self.polygon_points[:, 1] = self.map_y(plot_rect, np.asarray(self.ydata, dtype=np.float64))
+
+    def paintEvent(self, event):
+        # redraw() only schedules this, the trace is really drawn here
+        with instrumentation.time('ui.canvas_paint'):
+            self.paint()
+
+    def paint(self):
+        plot_rect = self.get_plot_rect()
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), Qt.white)
+        painter.setFont(self.font)
+        painter.setPen(Qt.black)
+        painter.drawRect(plot_rect)
+
+        text_height = painter.fontMetrics().height()
+        for tick, label in zip(*self.x_ticks):
+            x = self.map_x(plot_rect, tick)
+            painter.drawLine(QPointF(x, plot_rect.bottom()), QPointF(x, plot_rect.bottom() + 5))
+            painter.drawText(QRectF(x - 50, plot_rect.bottom() + 8, 100, text_height), Qt.AlignHCenter, str(label))
+        for tick, label in zip(*self.y_ticks):
+            y = self.map_y(plot_rect, tick)
+            painter.drawLine(QPointF(plot_rect.left() - 5, y), QPointF(plot_rect.left(), y))
+            painter.drawText(QRectF(0, y - text_height / 2, plot_rect.left() - 8, text_height),
+                             Qt.AlignRight | Qt.AlignVCenter, str(label))
+
+        painter.drawText(QRectF(plot_rect.left(), self.height() - text_height - 8, plot_rect.width(), text_height),
+                         Qt.AlignHCenter, self.x_label)
+        painter.save()
+        painter.translate(8, plot_rect.center().y())
+        painter.rotate(-90)
+        painter.drawText(QRectF(-plot_rect.height() / 2, 0, plot_rect.height(), text_height), Qt.AlignHCenter,
+                         self.y_label)
+        painter.restore()
+
+        if len(self.ydata):
+            self.update_polygon(plot_rect)
+            painter.setClipRect(plot_rect)
+            painter.setPen(self.trace_pen)
+            painter.drawPolyline(self.polygon)
+        painter.end()
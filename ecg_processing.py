@@ -0,0 +1,44 @@
+import threading
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from ecg_instrumentation import instrumentation
+
+
+class ProcessingWorker(QObject):
+
+    # Drains the samples of a live measurement from the sample queue (the consumer side of an SpscRingBuffer) into the
+    # processor's store, runs the processor on them on a background thread and posts every result through
+    # result_ready. The signal is queued to the thread of the connected receivers, so their slots run on the GUI thread
+    # and only ever see a finished result, never the processor half way through a step.
+    result_ready = pyqtSignal(object)
+
+    def __init__(self, sample_queue, processor, processing_interval=0.02):
+        super(ProcessingWorker, self).__init__()
+        self.sample_queue = sample_queue
+        self.processor = processor
+        self.processing_interval = processing_interval  # seconds
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name="ecg-processing", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        # once this returns the processor is idle and process() may be called from the calling thread
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def process(self):
+        with instrumentation.time('processing.step'):
+            self.processor.ecg_data.extend(self.sample_queue.drain())
+            return self.processor.process()
+
+    def run(self):
+        while not self.stop_event.wait(self.processing_interval):
+            if len(self.sample_queue):
+                self.result_ready.emit(self.process())
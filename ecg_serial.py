@@ -0,0 +1,315 @@
+import threading
+import time
+
+import numpy as np
+
+from ecg_instrumentation import instrumentation
+
+
+class SerialProtocol:
+    ASCII = 1  # one decimal sample per line, the default of the measurement unit
+    BINARY = 2  # fixed size frames described by BINARY_FRAME_DTYPE
+
+
+BINARY_SYNC_WORD = 0xA55A
+BINARY_SYNC_BYTES = BINARY_SYNC_WORD.to_bytes(2, 'little')
+# every frame is three little-endian 16 bit words: sync word, sequence counter (wraps at 65536) and the ADC sample
+BINARY_FRAME_DTYPE = np.dtype([('sync', '<u2'), ('sequence', '<u2'), ('sample', '<u2')])
+
+# Samples that are due at the nominal rate by the host clock but never arrived are only counted as lost beyond what
+# these explain: the varying latency of a batch (seconds) and a unit clock that runs somewhat slow (a fraction of the
+# rate, RC oscillators of microcontrollers are specified to about that)
+OVERDUE_LATENCY_ALLOWANCE = 0.05
+OVERDUE_RATE_TOLERANCE = 0.002
+
+
+class SerialStatistics:
+
+    # Counters of one measurement, a snapshot taken by SerialReader.get_statistics()
+    def __init__(self, received_sample_count=0, missing_sample_count=0, malformed_sample_count=0,
+                 discarded_byte_count=0, read_error_count=0, estimated_sample_rate=None, timed_duration=0,
+                 timed_sample_count=0):
+        self.received_sample_count = received_sample_count
+        self.missing_sample_count = missing_sample_count  # gaps in the sequence counter, binary protocol only
+        self.malformed_sample_count = malformed_sample_count  # lines that are not a valid sample, ASCII protocol only
+        self.discarded_byte_count = discarded_byte_count  # bytes skipped to find the next frame, binary protocol only
+        self.read_error_count = read_error_count
+        self.estimated_sample_rate = estimated_sample_rate  # hertz, None until there is enough data for an estimate
+        # host clock seconds from the first to the last read batch and the samples sent in between (received or missing)
+        self.timed_duration = timed_duration
+        self.timed_sample_count = timed_sample_count
+
+    def is_clean(self):
+        # skipped bytes alone are no problem, the stream may well start in the middle of a frame
+        return not (self.missing_sample_count or self.malformed_sample_count or self.read_error_count)
+
+    def get_overdue_sample_count(self, nominal_sample_rate):
+        # The gap detection of a protocol without a sequence counter (ASCII): the samples that should have arrived at the
+        # nominal rate since the first batch and did not. Sequence gaps are already part of timed_sample_count, so for
+        # the binary protocol this stays at 0 and nothing is counted twice.
+        due_duration = self.timed_duration * (1 - OVERDUE_RATE_TOLERANCE) - OVERDUE_LATENCY_ALLOWANCE
+        return max(0, int(nominal_sample_rate * due_duration) - self.timed_sample_count)
+
+
+class SampleRateEstimator:
+
+    # Estimates the real sample rate of the unit against the host's monotonic clock. Every read batch adds a point (the
+    # time the read returned, the number of samples sent up to the end of the batch) and the rate is the slope of the
+    # least squares line through all points, kept as running sums (Welford's method) so nothing is stored per point.
+    # A batch arrives some varying USB and driver latency after it was sampled, that error averages out as the
+    # points span more time, so there is no estimate until they span min_duration seconds.
+    def __init__(self, min_duration=2):
+        self.min_duration = min_duration
+        self.reset()
+
+    def reset(self):
+        self.first_timestamp = None
+        self.first_sample_count = 0
+        self.last_sample_count = 0
+        self.point_count = 0
+        self.mean_time = 0
+        self.mean_sample_count = 0
+        self.time_variance_sum = 0
+        self.covariance_sum = 0
+        self.last_time = 0
+
+    def add(self, timestamp, sample_count):
+        if self.first_timestamp is None:
+            self.first_timestamp = timestamp
+            self.first_sample_count = sample_count
+        self.last_sample_count = sample_count
+        time_since_first = timestamp - self.first_timestamp
+        self.point_count += 1
+        time_deviation = time_since_first - self.mean_time
+        self.mean_time += time_deviation / self.point_count
+        self.mean_sample_count += (sample_count - self.mean_sample_count) / self.point_count
+        self.time_variance_sum += time_deviation * (time_since_first - self.mean_time)
+        self.covariance_sum += time_deviation * (sample_count - self.mean_sample_count)
+        self.last_time = time_since_first
+
+    def get_sample_rate(self):
+        if self.last_time < self.min_duration or not self.time_variance_sum:
+            return None
+        return self.covariance_sum / self.time_variance_sum
+
+
+class AsciiLineDecoder:
+
+    def __init__(self, max_value=4095):
+        self.max_value = max_value
+        self.pending_data = b''
+        self.malformed_line_count = 0
+
+    def reset(self):
+        self.pending_data = b''
+        self.malformed_line_count = 0
+
+    def decode(self, data):
+        lines = (self.pending_data + data).split(b'\n')
+        # the last element is an unterminated line (or empty), it is completed by the next read
+        self.pending_data = lines.pop()
+
+        try:
+            samples = np.array([int(line) for line in lines], dtype=np.int64)
+        except (ValueError, OverflowError):
+            # e.g. an empty line, noise, or digits of several lines run together after an overrun
+            samples = np.array([self.parse_line(line) for line in lines if line.strip()], dtype=np.int64)
+
+        valid_mask = (samples >= 0) & (samples <= self.max_value)
+        if not valid_mask.all():
+            self.malformed_line_count += len(samples) - np.count_nonzero(valid_mask)
+            samples = samples[valid_mask]
+        return samples.astype(np.uint16)
+
+    def parse_line(self, line):
+        try:
+            value = int(line)
+        except ValueError:
+            return -1  # dropped by the range check in decode and counted as malformed there
+        # a value that does not even fit the array is just as malformed as one that is out of range
+        return value if 0 <= value <= self.max_value else -1
+
+
+class BinaryFrameDecoder:
+
+    def __init__(self):
+        self.pending_data = b''
+        self.discarded_byte_count = 0
+        self.last_sequence = None
+        self.missing_sample_count = 0
+
+    def reset(self):
+        self.pending_data = b''
+        self.discarded_byte_count = 0
+        self.last_sequence = None
+        self.missing_sample_count = 0
+
+    def decode(self, data):
+        data = self.pending_data + data
+        frame_size = BINARY_FRAME_DTYPE.itemsize
+        samples = []
+        offset = self.find_sync(data, 0)
+
+        while len(data) - offset >= frame_size:
+            frames = np.frombuffer(data, dtype=BINARY_FRAME_DTYPE, count=(len(data) - offset) // frame_size,
+                                   offset=offset)
+            invalid_frame_indices = np.flatnonzero(frames['sync'] != BINARY_SYNC_WORD)
+            valid_frame_count = invalid_frame_indices[0] if len(invalid_frame_indices) else len(frames)
+            samples.append(frames['sample'][:valid_frame_count])
+            self.count_missing_frames(frames['sequence'][:valid_frame_count])
+            offset += valid_frame_count * frame_size
+            if valid_frame_count == len(frames):
+                break
+            # the frame at the offset is broken, drop its first byte and search for the next sync word
+            offset = self.find_sync(data, offset + 1)
+            self.discarded_byte_count += 1
+
+        self.pending_data = data[offset:]
+        if samples:
+            return np.concatenate(samples)
+        return np.empty(0, dtype=np.uint16)
+
+    def count_missing_frames(self, sequences):
+        if len(sequences) == 0:
+            return
+        sequences = sequences.astype(np.int64)
+        previous_sequences = np.empty_like(sequences)
+        previous_sequences[0] = sequences[0] - 1 if self.last_sequence is None else self.last_sequence
+        previous_sequences[1:] = sequences[:-1]
+        # the counter wraps at 65536, a step backwards (a repeated frame) shows up as a huge gap and is not counted
+        gaps = (sequences - previous_sequences - 1) % 65536
+        self.missing_sample_count += int(gaps[gaps < 32768].sum())
+        self.last_sequence = int(sequences[-1])
+
+    def find_sync(self, data, offset):
+        sync_offset = data.find(BINARY_SYNC_BYTES, offset)
+        if sync_offset < 0:
+            # the last byte may be the first half of a sync word whose second half has not arrived yet
+            sync_offset = max(offset, len(data) - 1)
+        self.discarded_byte_count += sync_offset - offset
+        return sync_offset
+
+
+class SerialReader:
+
+    # Reads the measurement unit on a background thread. While no measurement is active the thread blocks on
+    # measurement_event instead of polling, and every read returns after at most read_timeout seconds, which bounds how
+    # long stop() and close_port() wait for the thread to let go of the port.
+    def __init__(self, sample_queue, serial_protocol, read_timeout=0.1):
+        self.sample_queue = sample_queue  # the producer side of an SpscRingBuffer
+        self.serial_protocol = serial_protocol
+        self.read_timeout = read_timeout
+        self.ser = None
+        self.recording_writer = None
+        self.decoders = {SerialProtocol.ASCII: AsciiLineDecoder(), SerialProtocol.BINARY: BinaryFrameDecoder()}
+        self.received_sample_count = 0
+        self.read_error_count = 0
+        self.sample_rate_estimator = SampleRateEstimator()
+
+        self.port_lock = threading.Lock()
+        self.measurement_event = threading.Event()
+        self.stop_requested = False
+        self.thread = None
+
+    def start(self):
+        self.stop_requested = False
+        self.thread = threading.Thread(target=self.run, name="serial-reader", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        # a recording that is still running is finished, otherwise its buffered samples would be lost at exit
+        self.stop_recording()
+        self.stop_requested = True
+        self.measurement_event.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        self.close_port()
+
+    def open_port(self, serial_port, baud_rate):
+        # pyserial is only needed once a port is opened, not by the batch analysis or the start up of the GUI
+        import serial
+
+        ser = serial.Serial(serial_port, baud_rate, timeout=self.read_timeout)
+        with self.port_lock:
+            self.ser = ser
+
+    def close_port(self):
+        self.measurement_event.clear()
+        with self.port_lock:
+            if self.ser:
+                self.ser.close()
+                self.ser = None
+
+    def write(self, data):
+        ser = self.ser
+        if ser:
+            ser.write(data)
+
+    def start_measurement(self):
+        self.measurement_event.set()
+
+    def start_recording(self, recording_writer):
+        recording_writer.start()
+        with self.port_lock:
+            self.recording_writer = recording_writer
+
+    def stop_recording(self):
+        # taken under the port lock, so once the writer is stopped the reader thread will not hand it more samples
+        with self.port_lock:
+            recording_writer = self.recording_writer
+            self.recording_writer = None
+        if recording_writer:
+            recording_writer.stop()
+        return recording_writer
+
+    def stop_measurement(self):
+        self.measurement_event.clear()
+
+    def get_statistics(self):
+        return SerialStatistics(self.received_sample_count,
+                                self.decoders[SerialProtocol.BINARY].missing_sample_count,
+                                self.decoders[SerialProtocol.ASCII].malformed_line_count,
+                                self.decoders[SerialProtocol.BINARY].discarded_byte_count,
+                                self.read_error_count, self.sample_rate_estimator.get_sample_rate(),
+                                self.sample_rate_estimator.last_time,
+                                self.sample_rate_estimator.last_sample_count -
+                                self.sample_rate_estimator.first_sample_count)
+
+    def run(self):
+        while not self.stop_requested:
+            if not self.measurement_event.is_set():
+                self.measurement_event.wait()
+                for decoder in self.decoders.values():
+                    decoder.reset()
+                self.received_sample_count = 0
+                self.read_error_count = 0
+                self.sample_rate_estimator.reset()
+                continue
+
+            with self.port_lock:
+                if not self.ser:
+                    self.measurement_event.clear()
+                    continue
+                try:
+                    # one read for everything the driver has buffered, decoded and queued in bulk
+                    data = self.ser.read(max(1, self.ser.in_waiting))
+                    read_timestamp = time.monotonic()
+                    with instrumentation.time('serial.decode_and_queue'):
+                        samples = self.decoders[self.serial_protocol[0]].decode(data)
+                        self.sample_queue.push(samples)
+                    instrumentation.count('serial.reads')
+                    instrumentation.count('serial.bytes', len(data))
+                    self.received_sample_count += len(samples)
+                    if len(samples):
+                        # the lost frames were sent as well and took their time
+                        self.sample_rate_estimator.add(read_timestamp, self.received_sample_count + self.decoders[
+                            SerialProtocol.BINARY].missing_sample_count)
+                    if self.recording_writer:
+                        self.recording_writer.write(samples)
+                    continue
+                except:
+                    # counted instead of printed, the status label shows the count
+                    self.read_error_count += 1
+            # keep a failing port (e.g. an unplugged device) from turning this into a busy loop
+            time.sleep(self.read_timeout)
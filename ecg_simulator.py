@@ -0,0 +1,243 @@
+import argparse
+import os
+import select
+import threading
+import time
+import tty
+
+import numpy as np
+
+from ecg_files import EXAMPLE_RECORDING_FILE, EXAMPLE_RECORDING_SAMPLE_RATE, load_text_recording
+from ecg_serial import BINARY_FRAME_DTYPE, BINARY_SYNC_WORD, SerialProtocol
+
+# the measurement unit's command codes, as EcgWindow.write_serial sends them
+START_MEASUREMENT_COMMAND = b'1'
+STOP_MEASUREMENT_COMMAND = b'2'
+
+# (amplitude in ADC units, offset from the R peak in seconds, width in seconds) of the P, Q, R, S and T waves
+SYNTHETIC_WAVES = [(120, -0.2, 0.025), (-100, -0.03, 0.008), (1900, 0, 0.01), (-350, 0.03, 0.01), (300, 0.25, 0.04)]
+SYNTHETIC_BASELINE = 2048
+
+
+def create_synthetic_beat(sample_rate, heart_rate=75):
+    # one heartbeat built from Gaussian waves, repeating it gives a regular ECG with R peaks the default thresholds find
+    beat_duration = 60 / heart_rate
+    time_points = np.arange(round(sample_rate * beat_duration)) / sample_rate - beat_duration / 2
+    beat = np.full(len(time_points), SYNTHETIC_BASELINE, dtype=np.float64)
+    for amplitude, offset, width in SYNTHETIC_WAVES:
+        beat += amplitude * np.exp(-((time_points - offset) / width) ** 2 / 2)
+    return np.clip(np.round(beat), 0, 4095).astype(np.uint16)
+
+
+def resample(samples, source_sample_rate, sample_rate):
+    # linear interpolation, so a recording keeps its heart rate when it is replayed at another sample rate
+    if source_sample_rate == sample_rate:
+        return np.asarray(samples, dtype=np.uint16)
+    resampled_count = round(len(samples) * sample_rate / source_sample_rate)
+    source_indices = np.arange(resampled_count) * (source_sample_rate / sample_rate)
+    return np.round(np.interp(source_indices, np.arange(len(samples)), samples)).astype(np.uint16)
+
+
+def encode_ascii(samples):
+    return ('\n'.join(map(str, samples.tolist())) + '\n').encode('ascii')
+
+
+def encode_binary(samples, sequences):
+    frames = np.empty(len(samples), dtype=BINARY_FRAME_DTYPE)
+    frames['sync'] = BINARY_SYNC_WORD
+    frames['sequence'] = sequences
+    frames['sample'] = samples
+    return frames.tobytes()
+
+
+class VirtualMeasurementUnit:
+
+    # A software stand-in for the measurement unit behind a pseudo terminal, which pyserial opens like any serial port.
+    # Like the real unit it streams nothing until it receives START_MEASUREMENT and stops on STOP_MEASUREMENT. The
+    # samples are the given ones repeated endlessly at sample_rate, sent every chunk_interval seconds as far as they are
+    # due by the host's clock. On top of that it can add Gaussian noise (standard deviation in ADC units), drop
+    # gap_length samples gap_rate times per second on average (the sequence counter still counts them, like frames lost
+    # on the line) and hold the data back to send it in one burst every burst_interval seconds (like a USB bridge with a
+    # large latency timer). Nothing waits for the reader: what the pseudo terminal does not take is dropped and counted.
+    def __init__(self, samples, sample_rate, serial_protocol=SerialProtocol.ASCII, noise=0, gap_rate=0, gap_length=0,
+                 burst_interval=0, chunk_interval=0.005, max_pending_byte_count=2 ** 20, seed=None):
+        self.samples = np.asarray(samples, dtype=np.uint16)
+        self.sample_rate = sample_rate
+        self.serial_protocol = serial_protocol
+        self.noise = noise
+        self.gap_rate = gap_rate
+        self.gap_length = gap_length
+        self.burst_interval = burst_interval
+        self.chunk_interval = chunk_interval  # seconds
+        self.max_pending_byte_count = max_pending_byte_count
+        self.random_generator = np.random.default_rng(seed)
+
+        self.port_name = None
+        self.master_fd = None
+        self.slave_fd = None
+        self.stop_requested = False
+        self.thread = None
+
+        self.is_measuring = False
+        self.measurement_start_time = 0
+        self.due_sample_count = 0  # samples due since the start of the measurement, sent or dropped in a gap
+        self.sent_sample_count = 0
+        self.skipped_sample_count = 0
+        self.dropped_byte_count = 0
+        self.pending_samples = []
+        self.pending_data = b''
+        self.gap_remaining_count = 0
+        self.next_burst_time = 0
+
+    def start(self):
+        # returns the name of the port to open, e.g. /dev/pts/3
+        self.master_fd, self.slave_fd = os.openpty()
+        # the slave end stays open here as well, so the port keeps working while the reader closes and reopens it
+        tty.setraw(self.slave_fd)
+        os.set_blocking(self.master_fd, False)
+        self.port_name = os.ttyname(self.slave_fd)
+        self.stop_requested = False
+        self.thread = threading.Thread(target=self.run, name="virtual-measurement-unit", daemon=True)
+        self.thread.start()
+        return self.port_name
+
+    def stop(self):
+        self.stop_requested = True
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        os.close(self.master_fd)
+        os.close(self.slave_fd)
+
+    def start_measurement(self):
+        self.is_measuring = True
+        self.measurement_start_time = time.monotonic()
+        self.next_burst_time = self.measurement_start_time + self.burst_interval
+        self.due_sample_count = 0
+        self.pending_samples = []
+        self.gap_remaining_count = 0
+
+    def stop_measurement(self):
+        self.is_measuring = False
+        self.pending_samples = []
+        self.pending_data = b''
+
+    def handle_commands(self, data):
+        # like the unit, only the latest command counts
+        for command in reversed(data):
+            if command == START_MEASUREMENT_COMMAND[0]:
+                self.start_measurement()
+                return
+            if command == STOP_MEASUREMENT_COMMAND[0]:
+                self.stop_measurement()
+                return
+
+    def generate(self, now):
+        due_sample_count = int((now - self.measurement_start_time) * self.sample_rate)
+        count = due_sample_count - self.due_sample_count
+        if count <= 0:
+            return
+        first_index = self.due_sample_count
+        self.due_sample_count = due_sample_count
+
+        samples = self.samples[np.arange(first_index, due_sample_count) % len(self.samples)]
+        if self.noise:
+            samples = np.clip(np.round(samples + self.random_generator.normal(0, self.noise, count)), 0, 4095)
+            samples = samples.astype(np.uint16)
+        sequences = np.arange(first_index, due_sample_count) % 65536
+
+        # a gap starts with the probability of one in this chunk's time and swallows the next gap_length samples
+        if self.gap_rate and self.random_generator.random() < self.gap_rate * count / self.sample_rate:
+            self.gap_remaining_count += self.gap_length
+        skipped_count = min(self.gap_remaining_count, count)
+        if skipped_count:
+            self.gap_remaining_count -= skipped_count
+            self.skipped_sample_count += skipped_count
+            samples = samples[skipped_count:]
+            sequences = sequences[skipped_count:]
+        if len(samples):
+            self.pending_samples.append((samples, sequences))
+
+    def send(self, now):
+        if self.pending_samples and now >= self.next_burst_time:
+            self.next_burst_time = now + self.burst_interval
+            samples = np.concatenate([samples for samples, sequences in self.pending_samples])
+            sequences = np.concatenate([sequences for samples, sequences in self.pending_samples])
+            self.pending_samples = []
+            match self.serial_protocol:
+                case SerialProtocol.BINARY:
+                    self.pending_data += encode_binary(samples, sequences)
+                case _:
+                    self.pending_data += encode_ascii(samples)
+            self.sent_sample_count += len(samples)
+
+        if len(self.pending_data) > self.max_pending_byte_count:
+            # the reader does not keep up (or has not opened the port), the oldest bytes are lost like in a full UART
+            dropped_count = len(self.pending_data) - self.max_pending_byte_count
+            self.pending_data = self.pending_data[dropped_count:]
+            self.dropped_byte_count += dropped_count
+        if self.pending_data:
+            try:
+                written_count = os.write(self.master_fd, self.pending_data)
+            except BlockingIOError:
+                written_count = 0
+            self.pending_data = self.pending_data[written_count:]
+
+    def run(self):
+        while not self.stop_requested:
+            readable, _, _ = select.select([self.master_fd], [], [], self.chunk_interval)
+            if readable:
+                try:
+                    self.handle_commands(os.read(self.master_fd, 1024))
+                except BlockingIOError:
+                    pass
+            if self.is_measuring:
+                now = time.monotonic()
+                self.generate(now)
+                self.send(now)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Emulate the ECG measurement unit on a pseudo terminal, for testing "
+                                                 "and load testing the live measurement without the device.")
+    parser.add_argument("--source", default="example",
+                        help="'example' to replay the example recording, 'synthetic' for a generated ECG, or the path "
+                             "of a text recording")
+    parser.add_argument("--source-sample-rate", type=float, default=EXAMPLE_RECORDING_SAMPLE_RATE,
+                        help="sample rate of the replayed recording in hertz")
+    parser.add_argument("--sample-rate", type=float, default=500, help="sample rate of the stream in hertz")
+    parser.add_argument("--heart-rate", type=float, default=75, help="heart rate of the synthetic ECG in BPM")
+    parser.add_argument("--protocol", choices=['ascii', 'binary'], default='ascii')
+    parser.add_argument("--noise", type=float, default=0, help="standard deviation of added noise in ADC units")
+    parser.add_argument("--gap-rate", type=float, default=0, help="average number of gaps per second")
+    parser.add_argument("--gap-length", type=int, default=50, help="samples lost in a gap")
+    parser.add_argument("--burst-interval", type=float, default=0,
+                        help="send the samples in bursts this many seconds apart instead of continuously")
+    parser.add_argument("--seed", type=int, help="seed of the noise and gap generator")
+    args = parser.parse_args()
+
+    match args.source:
+        case 'synthetic':
+            samples = create_synthetic_beat(args.sample_rate, args.heart_rate)
+        case 'example':
+            samples = resample(load_text_recording(EXAMPLE_RECORDING_FILE), args.source_sample_rate, args.sample_rate)
+        case _:
+            samples = resample(load_text_recording(args.source), args.source_sample_rate, args.sample_rate)
+    serial_protocol = SerialProtocol.BINARY if args.protocol == 'binary' else SerialProtocol.ASCII
+
+    unit = VirtualMeasurementUnit(samples, args.sample_rate, serial_protocol, args.noise, args.gap_rate,
+                                  args.gap_length, args.burst_interval, seed=args.seed)
+    port_name = unit.start()
+    print("Virtual measurement unit on " + port_name + ", set g_serial_port in ecg_ui.py to it. Ctrl+C to quit.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    unit.stop()
+    print(str(unit.sent_sample_count) + " samples sent, " + str(unit.skipped_sample_count) + " skipped in gaps, "
+          + str(unit.dropped_byte_count) + " bytes dropped")
+
+
+if __name__ == '__main__':
+    main()
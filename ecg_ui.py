@@ -1,19 +1,23 @@
-import statistics
 import sys
-import threading
 import time
-from datetime import datetime
 
-import matplotlib
-import serial
+import numpy as np
 from PyQt5.QtCore import pyqtSlot, Qt
 from PyQt5.QtWidgets import QPushButton, QHBoxLayout, QVBoxLayout, QMainWindow, QWidget, QStackedWidget, \
-    QFileDialog, QLabel, QFrame, QMessageBox, QSlider
+    QFileDialog, QLabel, QFrame, QMessageBox, QSlider, QComboBox
 from PyQt5 import QtWidgets, QtCore, QtGui
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
 
-matplotlib.use('Qt5Agg')
+from ecg_acquisition import AcquisitionMode, AcquisitionProcess
+from ecg_analysis import R_PEAK_LOWER_THRESHOLD, R_PEAK_UPPER_THRESHOLD, EcgProcessor
+from ecg_buffers import RingBuffer, SampleStore, SpscRingBuffer
+from ecg_decimation import MinMaxPyramid, decimate_min_max
+from ecg_files import BINARY_RECORDING_EXTENSION, InvalidRecordingError, RecordingWriter, load_binary_recording, \
+    load_text_recording
+from ecg_instrumentation import instrumentation
+from ecg_pacing import FramePacer
+from ecg_plotting import PlotBackendCode, create_canvas
+from ecg_processing import ProcessingWorker
+from ecg_serial import SerialProtocol, SerialReader
 
 
 # Take care of code indexing, if it starts with zero it may be important for condition checking or indexing later
@@ -36,48 +40,53 @@ class ErrorCode:
     NO_ERROR = 0
     INVALID_CONTENT = 1
     NOT_ENOUGH_DATA = 2
-
-
-class MplCanvas(FigureCanvas):
-
-    def __init__(self, width=30, height=12, dpi=50):
-        fig = Figure(figsize=(width, height), dpi=dpi)
-        self.axes = fig.add_subplot(111)
-        super(MplCanvas, self).__init__(fig)
+    UNSUPPORTED_SAMPLE_RATE = 3
 
 
 class EcgWindow(QMainWindow):
 
-    def __init__(self, serial_port, baud_rate, ser, ecg_data, is_measurement_in_progress):
+    def __init__(self, serial_port, baud_rate, serial_reader, ecg_data, sample_queue, is_measurement_in_progress,
+                 plot_backend_code, target_fps, use_estimated_sample_rate, show_performance_overlay):
         super(EcgWindow, self).__init__()
 
         self.serial_port = serial_port
         self.baud_rate = baud_rate
-        self.ser = ser
+        self.serial_reader = serial_reader
         self.ecg_data = ecg_data
+        self.sample_queue = sample_queue
+        self.overflow_count_at_start = 0
         self.is_measurement_in_progress = is_measurement_in_progress
 
-        self.plot = None
-        self.display_count = 2000
-        self.xdata = list(range(self.display_count))
-        self.ydata = []
+        self.last_displayed_index = 0
+        self.sampling_time = 2  # milliseconds
+        self.sampling_rate = int(1 / (self.sampling_time * pow(10, -3)))  # hertz
+        # the rate the unit really samples at, measured against the host clock while a measurement is live
+        self.estimated_sample_rate = None  # hertz
+        self.use_estimated_sample_rate = use_estimated_sample_rate
+
+        # seconds, the first one is the default and the shortest loadable file
+        self.display_durations = [4, 10, 30, 60, 300, 1800, 3600]
+        self.display_count = self.display_durations[0] * self.sampling_rate
+        self.displayed_range = None  # from and to sample index when scrolling through finished data, None while live
+        self.min_max_pyramid = MinMaxPyramid()
+        self.xdata = np.arange(self.display_count)
+        self.ydata = RingBuffer(self.display_count)
         self.min_ydata_value = 0
         self.max_ydata_value = 4095
         self.reset_ydata()
 
-        self.last_processed_index = 0
-        self.sampling_time = 2  # milliseconds
-        self.sampling_rate = int(1 / (self.sampling_time * pow(10, -3)))  # hertz
-
         self.measurement_duration = 30  # seconds
         self.time_between_health_data_calculations = 3  # seconds
         self.last_time_health_data_calculated = 0  # seconds
 
-        self.r_peak_detectable = True
-        self.r_peak_upper_threshold = 2600
-        self.r_peak_lower_threshold = 2000
-        self.r_peak_intervals = []  # stores the milliseconds between R peaks
-        self.r_peak_interval_counter = 0
+        self.r_peak_upper_threshold = R_PEAK_UPPER_THRESHOLD
+        self.r_peak_lower_threshold = R_PEAK_LOWER_THRESHOLD
+        # the analysis runs on the worker thread while measuring, the GUI thread only keeps its latest result
+        self.processor = EcgProcessor(self.ecg_data, self.sampling_time, self.r_peak_upper_threshold,
+                                      self.r_peak_lower_threshold, self.min_max_pyramid)
+        self.processing_worker = ProcessingWorker(self.sample_queue, self.processor)
+        self.processing_worker.result_ready.connect(self.processing_result_action)
+        self.processing_result = None
 
         self.button_style = """
             QPushButton {
@@ -94,6 +103,7 @@ class EcgWindow(QMainWindow):
         """
         self.button_size = (200, 40)
         self.start_button_default_text = "Start ECG measurement"
+        self.record_button_default_text = "Record ECG measurement"
         self.load_button_default_text = "Load ECG data"
         self.exit_button_default_text = "Exit"
         self.stop_button_default_text = "Stop ECG measurement"
@@ -117,10 +127,46 @@ class EcgWindow(QMainWindow):
         self.rr_interval_label = QLabel()
         self.bpm_label = QLabel()
 
+        # green while every sample of the measurement arrived and was processed, yellow as soon as one did not
+        self.status_label_style = """
+            QLabel {
+                border: 2px solid #000;
+                border-radius: 3px;
+                font-size: 16px;
+                background: %s;
+                color: #000;
+            }
+        """
+        self.status_label_colors = {True: "rgb(144, 238, 144)", False: "rgb(255, 218, 87)"}
+        self.status_label_size = (150, 40)
+
+        # ingest rate, queue depth and tick times of the running measurement, from the instrumentation
+        self.show_performance_overlay = show_performance_overlay
+        self.performance_label_style = """
+            QLabel {
+                border: 2px solid #000;
+                border-radius: 3px;
+                font-size: 12px;
+                background: #fff;
+                color: #000;
+            }
+        """
+        self.performance_label_size = (260, 40)
+        self.performance_label = QLabel()
+        self.performance_update_interval = 0.5  # seconds
+        self.last_performance_update_time = 0
+        self.last_performance_write_count = 0
+        self.last_performance_tick_count = 0
+        self.tick_histogram_at_start = None
+        self.status_label = QLabel()
+        self.display_duration_combo_box = QComboBox()
+
         self.home_stack = QWidget()
         self.graph_stack = QWidget()
 
-        self.file_dialog = QFileDialog()
+        # created on first use, building them is a noticeable part of the start up
+        self.file_dialog = None
+        self.recording_file_dialog = None
         self.message_box = QMessageBox()
 
         self.slider = QSlider(Qt.Horizontal, self)
@@ -128,12 +174,10 @@ class EcgWindow(QMainWindow):
         self.slider_max_value = 100
         self.slider_jump_value = 0
 
-        self.canvas = MplCanvas()
-        self.canvas.axes.set_xlabel("Time (s)", fontsize=20)
-        self.canvas.axes.set_ylabel("Measured Voltage (V)", fontsize=20)
-        self.canvas.axes.tick_params(axis='both', labelsize=20)
-        self.canvas.axes.set_yticks([0, 1024, 2048, 3072, 4095])
-        self.canvas.axes.set_yticklabels([0, 0.82, 1.65, 2.47, 3.3])
+        self.canvas = create_canvas(plot_backend_code[0])
+        self.canvas.set_labels("Time (s)", "Measured Voltage (V)")
+        self.canvas.set_limits(0, self.display_count - 1, self.min_ydata_value, self.max_ydata_value)
+        self.canvas.set_y_ticks([0, 1024, 2048, 3072, 4095], [0, 0.82, 1.65, 2.47, 3.3])
 
         self.init_home_ui()
         self.init_graph_ui()
@@ -148,17 +192,16 @@ class EcgWindow(QMainWindow):
 
         self.show()
 
+        # single shot, every tick schedules the next one once it knows how long it took
+        self.target_fps = target_fps
+        self.frame_pacer = FramePacer(target_fps[0])
         self.timer = QtCore.QTimer()
-        self.timer.setInterval(100)
+        self.timer.setSingleShot(True)
         self.timer.timeout.connect(self.tick_method)
 
     def init_home_ui(self):
         layout = QVBoxLayout()
 
-        self.file_dialog.setFileMode(QFileDialog.FileMode.ExistingFile)
-        self.file_dialog.setViewMode(QFileDialog.ViewMode.List)
-        self.file_dialog.setNameFilter("Text Files (*.txt)")
-
         self.message_box.setIcon(QMessageBox.Critical)
         self.message_box.setStandardButtons(QMessageBox.Ok)
 
@@ -167,6 +210,11 @@ class EcgWindow(QMainWindow):
         start_button.setStyleSheet(self.button_style)
         start_button.clicked.connect(self.start_button_action)
 
+        record_button = QPushButton(self.record_button_default_text)
+        record_button.setFixedSize(*self.button_size)
+        record_button.setStyleSheet(self.button_style)
+        record_button.clicked.connect(self.record_button_action)
+
         load_button = QPushButton(self.load_button_default_text)
         load_button.setFixedSize(*self.button_size)
         load_button.setStyleSheet(self.button_style)
@@ -178,6 +226,7 @@ class EcgWindow(QMainWindow):
         exit_button.clicked.connect(self.exit_button_action)
 
         layout.addWidget(start_button)
+        layout.addWidget(record_button)
         layout.addWidget(load_button)
         layout.addWidget(exit_button)
 
@@ -207,6 +256,22 @@ class EcgWindow(QMainWindow):
         self.bpm_label.setFixedSize(*self.label_size)
         self.bpm_label.setStyleSheet(self.label_style)
 
+        self.status_label.setFrameShape(QFrame.Panel)
+        self.status_label.setFixedSize(*self.status_label_size)
+        self.status_label.setAlignment(Qt.AlignCenter)
+        self.status_label.setStyleSheet(self.label_style)
+
+        self.performance_label.setFixedSize(*self.performance_label_size)
+        self.performance_label.setStyleSheet(self.performance_label_style)
+        self.performance_label.setVisible(self.show_performance_overlay[0])
+
+        for display_duration in self.display_durations:
+            self.display_duration_combo_box.addItem(
+                (str(display_duration) + " s" if display_duration < 60 else str(display_duration // 60) + " min")
+                + " window", display_duration)
+        self.display_duration_combo_box.setFixedSize(150, self.label_size[1])
+        self.display_duration_combo_box.currentIndexChanged[int].connect(self.display_duration_action)
+
         self.slider.valueChanged[int].connect(self.slider_action)
         self.slider.setMinimum(self.slider_min_value)
         self.slider.setMaximum(self.slider_max_value)
@@ -216,6 +281,9 @@ class EcgWindow(QMainWindow):
         header_layout.addWidget(self.countdown_label)
         header_layout.addWidget(self.rr_interval_label)
         header_layout.addWidget(self.bpm_label)
+        header_layout.addWidget(self.status_label)
+        header_layout.addWidget(self.performance_label)
+        header_layout.addWidget(self.display_duration_combo_box)
         header_layout.addWidget(self.universal_button)
         header_widget = QWidget()
         header_widget.setFixedHeight(60)
@@ -233,11 +301,20 @@ class EcgWindow(QMainWindow):
             self.start_measurement()
             self.switch_stack(StackCode.GRAPH)
 
+    @pyqtSlot()
+    def record_button_action(self):
+        recording_filename_with_path = self.select_recording_file()
+        if recording_filename_with_path and self.connect_serial_port():
+            if self.start_measurement(recording_filename_with_path):
+                self.switch_stack(StackCode.GRAPH)
+            else:
+                self.serial_reader.close_port()
+
     @pyqtSlot()
     def load_button_action(self):
         selected_filename_with_path = self.select_file()
         file_content = self.load_file(selected_filename_with_path)
-        if file_content:
+        if file_content is not None:
             self.load_measurement(file_content)
             self.switch_universal_button(ButtonCode.BACK)
             self.switch_stack(StackCode.GRAPH)
@@ -250,40 +327,98 @@ class EcgWindow(QMainWindow):
     def stop_button_action(self):
         self.switch_universal_button(ButtonCode.BACK)
         self.stop_measurement()
+        self.update_acquisition_status()
+
+    @pyqtSlot(int)
+    def display_duration_action(self, index):
+        self.display_count = self.display_durations[index] * self.sampling_rate
+        self.xdata = np.arange(self.display_count)
+        self.ydata = RingBuffer(self.display_count)
+        self.canvas.set_limits(0, self.display_count - 1, self.min_ydata_value, self.max_ydata_value)
+
+        if self.is_measurement_in_progress[0]:
+            self.reset_ydata()
+            self.ydata.extend(self.ecg_data[max(0, self.last_displayed_index - self.display_count):
+                                            self.last_displayed_index])
+            self.update_plot()
+        elif len(self.ecg_data):
+            # keep the start of the displayed range where it was
+            display_data_from_index = self.displayed_range[0] if self.displayed_range else 0
+            self.calculate_slider_jump_value()
+            self.slider.blockSignals(True)
+            self.slider.setValue(int(display_data_from_index / self.slider_jump_value))
+            self.slider.blockSignals(False)
+            self.slider_action(self.slider.value())
+        else:
+            self.reset_ydata()
+            self.update_plot()
+
+    @pyqtSlot(object)
+    def processing_result_action(self, result):
+        # results are queued, one can arrive after the final result of the measurement was already taken over
+        if self.processing_result is None or \
+                result.processed_sample_count >= self.processing_result.processed_sample_count:
+            self.processing_result = result
+
+    def closeEvent(self, event):
+        # a running measurement is stopped properly, which also finishes its recording
+        if self.is_measurement_in_progress[0]:
+            self.stop_measurement()
+        super(EcgWindow, self).closeEvent(event)
 
     @pyqtSlot()
     def back_button_action(self):
         self.switch_universal_button(ButtonCode.STOP)
-        if self.ser[0]:
-            self.ser[0].close()
+        self.serial_reader.close_port()
         self.switch_stack(StackCode.HOME)
 
     def connect_serial_port(self):
         try:
-            self.ser[0] = serial.Serial(self.serial_port[0], self.baud_rate[0])
+            self.serial_reader.open_port(self.serial_port[0], self.baud_rate[0])
             return True
         except:
             self.message_box.setWindowTitle("Connection error")
-            self.message_box.setText("Measurement unit is not connected on COM3 serial port.")
+            self.message_box.setText("Measurement unit is not connected on " + self.serial_port[0] + " serial port.")
             self.message_box.exec_()
         return False
 
-    def start_measurement(self):
-        self.write_serial(SerialCode.START_MEASUREMENT)
+    def start_measurement(self, recording_filename_with_path=None):
+        # returns False if the recording file could not be created, the measurement is not started then
         self.reset_measurement_data_and_graph_ui()
-        self.timer.start()
+        if recording_filename_with_path:
+            try:
+                self.serial_reader.start_recording(RecordingWriter(recording_filename_with_path, self.sampling_rate))
+            except OSError as error:
+                self.message_box.setWindowTitle("Recording error")
+                self.message_box.setText("The recording file could not be created: " + str(error))
+                self.message_box.exec_()
+                return False
+        # whatever the reader queued after the previous measurement was stopped does not belong to this one
+        self.sample_queue.discard()
+        self.overflow_count_at_start = self.sample_queue.overflow_count
+        self.reset_performance_overlay()
+        self.processing_worker.start()
+        self.serial_reader.start_measurement()
+        self.write_serial(SerialCode.START_MEASUREMENT)
+        # the setting is a shared list, a changed rate takes effect with the next measurement
+        self.frame_pacer.set_target_fps(self.target_fps[0])
+        self.frame_pacer.reset()
+        self.timer.start(self.frame_pacer.get_interval())
         self.is_measurement_in_progress[0] = True
+        return True
 
     def reset_measurement_data_and_graph_ui(self):
         self.ecg_data.clear()
-        self.r_peak_intervals.clear()
-        self.last_processed_index = 0
+        self.processor.reset()
+        self.processing_result = None
+        self.estimated_sample_rate = None
+        self.processor.sampling_time = self.sampling_time
+        self.last_displayed_index = 0
         self.last_time_health_data_calculated = 0
-        self.r_peak_interval_counter = 0
-        self.r_peak_detectable = True
+        self.displayed_range = None
         self.reset_ydata()
         self.reset_labels()
-        self.canvas.axes.set_xticks([])
+        self.canvas.set_x_ticks([], [])
         self.slider.hide()
         self.update_plot()
 
@@ -291,30 +426,64 @@ class EcgWindow(QMainWindow):
         self.stack.setCurrentIndex(stack_index)
 
     def select_file(self):
+        if self.file_dialog is None:
+            self.file_dialog = QFileDialog()
+            self.file_dialog.setFileMode(QFileDialog.FileMode.ExistingFile)
+            self.file_dialog.setViewMode(QFileDialog.ViewMode.List)
+            self.file_dialog.setNameFilter("ECG recordings (*.txt *" + BINARY_RECORDING_EXTENSION + ")")
+
         if self.file_dialog.exec():
             return self.file_dialog.selectedFiles()[0]
         return None
 
+    def select_recording_file(self):
+        if self.recording_file_dialog is None:
+            self.recording_file_dialog = QFileDialog()
+            self.recording_file_dialog.setAcceptMode(QFileDialog.AcceptMode.AcceptSave)
+            self.recording_file_dialog.setViewMode(QFileDialog.ViewMode.List)
+            self.recording_file_dialog.setNameFilters(
+                ["Binary ECG recordings (*" + BINARY_RECORDING_EXTENSION + ")", "Text Files (*.txt)"])
+
+        if self.recording_file_dialog.exec():
+            filename_with_path = self.recording_file_dialog.selectedFiles()[0]
+            if not filename_with_path.endswith((".txt", BINARY_RECORDING_EXTENSION)):
+                filename_with_path += BINARY_RECORDING_EXTENSION
+            return filename_with_path
+        return None
+
     def load_file(self, filename_with_path):
         error_code = ErrorCode.NO_ERROR
+        invalid_line_number = None
         if filename_with_path:
             try:
-                with open(filename_with_path, 'r') as file:
-                    file_content = file.readlines()
-                    file_content = [int(line.strip()) for line in file_content]
+                if filename_with_path.endswith(BINARY_RECORDING_EXTENSION):
+                    header, file_content = load_binary_recording(filename_with_path)
+                    if header['sample_rate'] != self.sampling_rate:
+                        error_code = ErrorCode.UNSUPPORTED_SAMPLE_RATE
+                else:
+                    file_content = load_text_recording(filename_with_path)
+            except InvalidRecordingError as error:
+                error_code = ErrorCode.INVALID_CONTENT
+                invalid_line_number = error.line_number
             except:
                 error_code = ErrorCode.INVALID_CONTENT
 
-            if len(file_content) < self.display_count:
+            if not error_code and len(file_content) < self.display_durations[0] * self.sampling_rate:
                 error_code = ErrorCode.NOT_ENOUGH_DATA
 
             if error_code:
                 self.message_box.setWindowTitle("File loading error")
                 match error_code:
                     case ErrorCode.INVALID_CONTENT:
-                        self.message_box.setText("The selected file is not supported or has invalid content.")
+                        text = "The selected file is not supported or has invalid content."
+                        if invalid_line_number:
+                            text += " The first invalid sample is on line " + str(invalid_line_number) + "."
+                        self.message_box.setText(text)
                     case ErrorCode.NOT_ENOUGH_DATA:
                         self.message_box.setText("The selected file does not contain enough data.")
+                    case ErrorCode.UNSUPPORTED_SAMPLE_RATE:
+                        self.message_box.setText("The selected file was not recorded at " + str(
+                            self.sampling_rate) + " Hz.")
                 self.message_box.exec_()
             else:
                 return file_content
@@ -322,9 +491,9 @@ class EcgWindow(QMainWindow):
 
     def load_measurement(self, file_content):
         self.reset_measurement_data_and_graph_ui()
-        self.ecg_data.extend(file_content)
+        self.ecg_data.assign(file_content)
+        self.processing_result_action(self.processor.process())
         self.initialize_slider()
-        self.detect_r_peaks()
         self.calculate_and_update_label_values()
 
     def switch_universal_button(self, button_code):
@@ -338,56 +507,153 @@ class EcgWindow(QMainWindow):
                 self.universal_button.setText(self.stop_button_default_text)
 
     def reset_ydata(self):
-        self.ydata = [self.min_ydata_value] + [self.max_ydata_value] * (self.display_count - 1)
+        self.ydata.reset([self.min_ydata_value] + [self.max_ydata_value] * (self.display_count - 1))
 
     def reset_labels(self):
         self.countdown_label.setText(self.countdown_label_default_text + "—")
         self.rr_interval_label.setText(self.rr_interval_label_default_text + "—")
         self.bpm_label.setText(self.bpm_label_default_text + "—")
+        self.status_label.setText("—")
+        self.status_label.setToolTip("")
+        self.status_label.setStyleSheet(self.label_style)
 
     def stop_measurement(self):
+        # a loaded recording (e.g. one without R peaks) ends up here as well, there is nothing to stop then
+        if not self.is_measurement_in_progress[0]:
+            return
         self.is_measurement_in_progress[0] = False
         self.write_serial(SerialCode.STOP_MEASUREMENT)
+        self.serial_reader.stop_measurement()
+        self.stop_recording()
         self.timer.stop()
+        # the samples that came in after the last result of the worker are processed here
+        self.processing_worker.stop()
+        self.processing_result_action(self.processing_worker.process())
+        if self.get_overflow_count():
+            print(str(self.get_overflow_count()) + " samples were dropped because they could not be processed in time")
         self.switch_universal_button(ButtonCode.BACK)
 
+    def stop_recording(self):
+        recording_writer = self.serial_reader.stop_recording()
+        if recording_writer and recording_writer.error:
+            self.message_box.setWindowTitle("Recording error")
+            self.message_box.setText("Writing " + recording_writer.filename_with_path + " failed: " + str(
+                recording_writer.error) + ". Only the first " + str(recording_writer.written_sample_count) +
+                                     " samples were written.")
+            self.message_box.exec_()
+        elif recording_writer and recording_writer.dropped_sample_count:
+            print(str(recording_writer.dropped_sample_count) + " samples could not be written to "
+                  + recording_writer.filename_with_path)
+
     def tick_method(self):
+        tick_start_time = time.perf_counter()
+        self.update_acquisition_status()
         if self.is_measurement_finished():
             self.stop_measurement()
             self.initialize_slider()
         else:
-            self.process_fresh_data()
-            self.update_plot()
-        self.calculate_and_update_label_values()
+            last_displayed_index = self.last_displayed_index
+            self.display_fresh_data()
+            # without new samples the frame would be the same as the last one
+            if self.last_displayed_index != last_displayed_index:
+                self.update_plot()
+        with instrumentation.time('ui.update_labels'):
+            self.calculate_and_update_label_values()
+        if self.show_performance_overlay[0]:
+            self.update_performance_overlay()
+
+        tick_cost = time.perf_counter() - tick_start_time
+        instrumentation.add_time('ui.tick', tick_cost)
+        if self.is_measurement_in_progress[0]:
+            self.frame_pacer.add_tick_cost(tick_cost)
+            self.timer.start(self.frame_pacer.get_interval())
 
     def is_measurement_finished(self):
-        return self.measurement_duration == self.get_elapsed_time()
+        # at a low frame rate a tick can come after the last whole second of the measurement
+        return self.get_elapsed_time() >= self.measurement_duration
 
     def get_elapsed_time(self):
-        return int(len(self.ecg_data) / self.sampling_rate)
-
-    def process_fresh_data(self):
-        self.ydata = self.ydata[len(self.ecg_data[self.last_processed_index:]):] + self.ecg_data[
-                                                                                   self.last_processed_index:]
-        self.detect_r_peaks()
-        self.last_processed_index = len(self.ecg_data)
-
-    def detect_r_peaks(self):
-        for i in range(self.last_processed_index, len(self.ecg_data) - 1):
-            self.r_peak_interval_counter += 1
-            if self.r_peak_detectable and self.ecg_data[i] > self.r_peak_upper_threshold \
-                    and self.ecg_data[i] > self.ecg_data[i + 1]:
-                self.r_peak_intervals.append(self.r_peak_interval_counter * self.sampling_time)
-                self.r_peak_interval_counter = 0
-                self.r_peak_detectable = False
-            elif self.ecg_data[i] < self.r_peak_lower_threshold:
-                self.r_peak_detectable = True
+        return int(len(self.ecg_data) / self.get_sampling_rate())
+
+    def get_sampling_rate(self):
+        # the nominal rate, unless the estimated rate is to be used and there is an estimate already
+        if self.use_estimated_sample_rate[0] and self.estimated_sample_rate:
+            return self.estimated_sample_rate
+        return self.sampling_rate
+
+    def display_fresh_data(self):
+        # the reader thread keeps appending, so the length is read once
+        ecg_data_length = len(self.ecg_data)
+        self.ydata.extend(self.ecg_data[self.last_displayed_index:ecg_data_length])
+        self.last_displayed_index = ecg_data_length
+
+    def get_overflow_count(self):
+        return self.sample_queue.overflow_count - self.overflow_count_at_start
+
+    def update_acquisition_status(self):
+        statistics = self.serial_reader.get_statistics()
+        self.estimated_sample_rate = statistics.estimated_sample_rate
+        self.processor.sampling_time = 1000 / self.get_sampling_rate()
+
+        # with the estimated rate in use the unit's clock is taken to be off, a deficit against the nominal rate is then
+        # no sign of lost samples
+        overdue_sample_count = 0
+        if not self.use_estimated_sample_rate[0]:
+            overdue_sample_count = statistics.get_overdue_sample_count(self.sampling_rate)
+        lost_sample_count = statistics.missing_sample_count + overdue_sample_count + self.get_overflow_count()
+        is_clean = statistics.is_clean() and not lost_sample_count
+        if is_clean:
+            self.status_label.setText("Signal OK")
+        else:
+            self.status_label.setText("Lost: " + str(lost_sample_count) + ", bad: " + str(
+                statistics.malformed_sample_count + statistics.read_error_count))
+        self.status_label.setStyleSheet(self.status_label_style % self.status_label_colors[is_clean])
+        self.status_label.setToolTip(
+            "Received samples: " + str(statistics.received_sample_count) +
+            "\nMissing samples (sequence gaps): " + str(statistics.missing_sample_count) +
+            "\nMissing samples (behind the nominal rate): " + str(overdue_sample_count) +
+            "\nSamples dropped before processing: " + str(self.get_overflow_count()) +
+            "\nMalformed samples: " + str(statistics.malformed_sample_count) +
+            "\nBytes skipped to resynchronize: " + str(statistics.discarded_byte_count) +
+            "\nSerial read errors: " + str(statistics.read_error_count) +
+            "\nEstimated sample rate: " + ("—" if self.estimated_sample_rate is None
+                                            else str(round(self.estimated_sample_rate, 2)) + " Hz"))
+
+    def reset_performance_overlay(self):
+        self.last_performance_update_time = time.monotonic()
+        self.last_performance_write_count = self.sample_queue.write_count
+        self.last_performance_tick_count = instrumentation.get_histogram('ui.tick').count
+        self.tick_histogram_at_start = instrumentation.get_histogram('ui.tick').copy()
+        self.performance_label.setText("")
+
+    def update_performance_overlay(self):
+        # the rates are the ones since the last update, the tick times the ones since the start of the measurement
+        now = time.monotonic()
+        elapsed_time = now - self.last_performance_update_time
+        if elapsed_time < self.performance_update_interval:
+            return
+
+        tick_histogram = instrumentation.get_histogram('ui.tick')
+        write_count = self.sample_queue.write_count
+        ingest_rate = (write_count - self.last_performance_write_count) / elapsed_time
+        fps = (tick_histogram.count - self.last_performance_tick_count) / elapsed_time
+        tick_time_texts = []
+        for percent in [50, 99]:
+            tick_time = tick_histogram.get_percentile(percent, self.tick_histogram_at_start)
+            tick_time_texts.append("—" if tick_time is None else str(round(tick_time * 1000, 1)))
+        self.performance_label.setText(
+            "Ingest: " + str(round(ingest_rate)) + " samples/s, queue: " + str(len(self.sample_queue)) +
+            "\nTick p50/p99: " + "/".join(tick_time_texts) + " ms, " + str(round(fps, 1)) + " FPS")
+
+        self.last_performance_update_time = now
+        self.last_performance_write_count = write_count
+        self.last_performance_tick_count = tick_histogram.count
 
     def get_rr_interval(self):
-        return round(statistics.fmean(self.r_peak_intervals) * pow(10, -3), 1)
+        return self.processing_result.rr_interval if self.processing_result else None
 
     def get_bpm(self):
-        return int((len(self.r_peak_intervals) + 1) / self.get_elapsed_time() * 60)
+        return self.processing_result.bpm if self.processing_result else None
 
     def calculate_and_update_label_values(self):
         elapsed_time = self.get_elapsed_time()
@@ -400,41 +666,46 @@ class EcgWindow(QMainWindow):
 
         if not self.is_measurement_in_progress[0] or self.is_health_data_ready_for_calculation():
             self.last_time_health_data_calculated = elapsed_time
-            try:
-                self.rr_interval_label.setText(
-                    self.rr_interval_label_default_text + str(self.get_rr_interval()) + " second")
-                self.bpm_label.setText(self.bpm_label_default_text + str(self.get_bpm()) + " beats")
-            except:
+            rr_interval = self.get_rr_interval()
+            bpm = self.get_bpm()
+            if rr_interval is not None and bpm is not None:
+                self.rr_interval_label.setText(self.rr_interval_label_default_text + str(round(rr_interval, 1)) + " second")
+                self.bpm_label.setText(self.bpm_label_default_text + str(bpm) + " beats")
+            else:
                 self.stop_measurement()
                 self.message_box.setWindowTitle("Signal processing error")
                 self.message_box.setText("The measured signal does not meet the requirements of a real ecg signal.")
                 self.message_box.exec_()
 
     def is_health_data_ready_for_calculation(self):
-        return self.get_elapsed_time() - self.last_time_health_data_calculated == self.time_between_health_data_calculations
+        return self.get_elapsed_time() - self.last_time_health_data_calculated >= self.time_between_health_data_calculations
 
     def calculate_and_update_x_axis_values(self, max_displayed_data):
-        self.canvas.axes.set_xticks([0, 500, 1000, 1500, 2000])
-        # division by thousands is necessary to convert milliseconds to seconds
-        self.canvas.axes.set_xticklabels(
-            [int((max_displayed_data - 2000) * self.sampling_time / 1000),
-             int((max_displayed_data - 1500) * self.sampling_time / 1000),
-             int((max_displayed_data - 1000) * self.sampling_time / 1000),
-             int((max_displayed_data - 500) * self.sampling_time / 1000),
-             int(max_displayed_data * self.sampling_time / 1000)])
-
-    def update_plot(self):
-        if self.plot is None:
-            plot_refs = self.canvas.axes.plot(self.xdata, self.ydata, 'r')
-            self.plot = plot_refs[0]
+        ticks = [self.display_count * i // 4 for i in range(5)]
+        sampling_rate = self.get_sampling_rate()
+        tick_seconds = [(max_displayed_data - self.display_count + tick) / sampling_rate for tick in ticks]
+        if sampling_rate == self.sampling_rate:
+            labels = [int(seconds) for seconds in tick_seconds]
         else:
-            self.plot.set_ydata(self.ydata)
+            # at an estimated rate the ticks are rarely on whole seconds, truncated two ticks could show the same second
+            labels = [round(seconds, 1) for seconds in tick_seconds]
+        self.canvas.set_x_ticks(ticks, labels)
 
-        self.canvas.draw()
+    def update_plot(self):
+        # at most a few vertices per pixel column, however long the displayed window is
+        with instrumentation.time('ui.update_plot'):
+            if self.displayed_range is None:
+                self.canvas.set_data(*decimate_min_max(self.xdata, self.ydata.view(), self.canvas.width()))
+            else:
+                display_data_from_index, display_data_to_index = self.displayed_range
+                xdata, min_ydata, max_ydata = self.min_max_pyramid.get_envelope(
+                    self.ecg_data, display_data_from_index, display_data_to_index, self.canvas.width())
+                self.canvas.set_envelope(xdata - display_data_from_index, min_ydata, max_ydata)
+        with instrumentation.time('ui.canvas_redraw'):
+            self.canvas.redraw()
 
     def write_serial(self, code):
-        if self.ser[0]:
-            self.ser[0].write(str(code).encode('ascii'))
+        self.serial_reader.write(str(code).encode('ascii'))
 
     def initialize_slider(self):
         self.slider.setValue(self.slider_min_value)
@@ -443,46 +714,63 @@ class EcgWindow(QMainWindow):
         self.slider.show()
 
     def calculate_slider_jump_value(self):
-        ecg_data_max_from_index = len(self.ecg_data) - self.display_count
-        self.slider_jump_value = ecg_data_max_from_index / self.slider_max_value
+        # one slider step moves the displayed range by a hundredth of its length, whatever the length of the data
+        ecg_data_max_from_index = max(0, len(self.ecg_data) - self.display_count)
+        self.slider_jump_value = max(1, self.display_count // 100)
+        self.slider.setMaximum(-(-ecg_data_max_from_index // self.slider_jump_value))
 
     def slider_action(self, value):
         display_data_from_index = int(value * self.slider_jump_value)
         if display_data_from_index + self.display_count > len(self.ecg_data):
             display_data_to_index = len(self.ecg_data)
-            display_data_from_index = display_data_to_index - self.display_count
+            display_data_from_index = max(0, display_data_to_index - self.display_count)
         else:
             display_data_to_index = display_data_from_index + self.display_count
 
-        self.calculate_and_update_x_axis_values(display_data_to_index + 1)
-        self.ydata = self.ecg_data[display_data_from_index:display_data_to_index]
+        self.calculate_and_update_x_axis_values(display_data_from_index + self.display_count + 1)
+        self.displayed_range = (display_data_from_index, display_data_to_index)
         self.update_plot()
 
 
-def read_serial(ser, ecg_data, is_measurement_in_progress):
-    while True:
-        if is_measurement_in_progress[0] and ser[0]:
-            try:
-                data = ser[0].readline().strip()
-                if data:
-                    ecg_data.append(int(data))
-            except:
-                print("Error reading from serial port at " + str(datetime.now()))
-        else:
-            time.sleep(0.5)
-
-
 g_serial_port = ["COM3"]
 g_baud_rate = [115200]
-g_ser = [None]
-g_ecg_data = []
-g_is_measurement_in_progress = [False]
-
-serial_read_thread = threading.Thread(target=read_serial,
-                                      args=(g_ser, g_ecg_data, g_is_measurement_in_progress))
-serial_read_thread.daemon = True
-serial_read_thread.start()
-
-app = QtWidgets.QApplication(sys.argv)
-w = EcgWindow(g_serial_port, g_baud_rate, g_ser, g_ecg_data, g_is_measurement_in_progress)
-app.exec_()
+g_serial_protocol = [SerialProtocol.ASCII]
+g_plot_backend_code = [PlotBackendCode.MATPLOTLIB]
+g_target_fps = [30]  # the live plot is redrawn at up to this rate, less often when the machine cannot keep up
+g_acquisition_mode = [AcquisitionMode.THREAD]
+# measure the real sample rate of the unit against the host clock and use it instead of the nominal one for the
+# countdown, the RR interval, the BPM and the time axis
+g_use_estimated_sample_rate = [False]
+# show the ingest rate, the queue depth and the tick times of a live measurement in the graph header
+g_show_performance_overlay = [False]
+# time the hot paths (serial decoding, processing, R peak detection, plotting, labels) and print the statistics on exit
+g_print_performance_statistics = [False]
+
+
+def main():
+    # everything with a side effect happens here, so importing this module (e.g. from a spawned acquisition process,
+    # a benchmark or a test) neither opens a window nor allocates the sample store
+    app = QtWidgets.QApplication(sys.argv)
+    # before the acquisition process is started, which takes the setting over
+    instrumentation.enabled = g_show_performance_overlay[0] or g_print_performance_statistics[0]
+    match g_acquisition_mode[0]:
+        case AcquisitionMode.PROCESS:
+            serial_reader = AcquisitionProcess(g_serial_protocol)
+            sample_queue = serial_reader.sample_queue
+        case _:
+            sample_queue = SpscRingBuffer()
+            serial_reader = SerialReader(sample_queue, g_serial_protocol)
+    window = EcgWindow(g_serial_port, g_baud_rate, serial_reader, SampleStore(), sample_queue, [False],
+                       g_plot_backend_code, g_target_fps, g_use_estimated_sample_rate, g_show_performance_overlay)
+    serial_reader.start()
+    exit_code = app.exec_()
+    serial_reader.stop()
+    if g_print_performance_statistics[0]:
+        print(instrumentation.format_report())
+        if g_acquisition_mode[0] == AcquisitionMode.PROCESS and serial_reader.performance_report:
+            print("Acquisition process: " + serial_reader.performance_report)
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())